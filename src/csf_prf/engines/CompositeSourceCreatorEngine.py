@@ -33,6 +33,7 @@ class CompositeSourceCreatorEngine(Engine):
         self.output_db = False
         self.junctions_layer = False
         self.sheets_layer = False
+        self.prepared_sheets = None
         self.output_data = None
         self.output_data = {
             'sheets': None,
@@ -58,7 +59,7 @@ class CompositeSourceCreatorEngine(Engine):
             self.download_enc_files()
 
         arcpy.AddMessage('Converting ENC files')
-        enc_engine = ENCReaderEngine(self.param_lookup, self.sheets_layer)
+        enc_engine = ENCReaderEngine(self.param_lookup, self.sheets_layer, self.prepared_sheets)
         enc_engine.start()
         self.output_data = {**self.output_data, **enc_engine.output_data}  # merge output from ENCReaderEngine
 
@@ -93,6 +94,8 @@ class CompositeSourceCreatorEngine(Engine):
             # outer_features, inner_features = self.split_inner_polygons(layer)
             # self.write_sheets_to_featureclass('sheets', layer, outer_features + inner_features, 'output_sheets')
             self.sheets_layer = layer
+            # Repair, subdivide, buffer and index the Sheets once for every later step
+            self.prepared_sheets = self.prepare_sheets(layer)
 
     def copy_layer_to_feature_class(self, output_data_type, layer, feature_class_name) -> None:
         """
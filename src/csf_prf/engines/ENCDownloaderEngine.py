@@ -3,8 +3,10 @@ import requests
 import shutil
 import arcpy
 import pathlib
+import zipfile
 
 from csf_prf.engines.Engine import Engine
+from csf_prf.helpers.enc_cache import get_dsid_edition
 from bs4 import BeautifulSoup
 
 arcpy.env.overwriteOutput = True
@@ -18,6 +20,7 @@ class ENCDownloaderEngine(Engine):
         self.xml_path = "https://charts.noaa.gov/ENCs/ENCProdCat.xml"
         self.sheets_layer = param_lookup['sheets'].valueAsText
         self.output_folder = param_lookup['output_folder'].valueAsText
+        self.cell_editions = {}
 
     def build_polygons_layer(self, polygons):
         """
@@ -62,9 +65,22 @@ class ENCDownloaderEngine(Engine):
             shutil.rmtree(output_path / 'ENC_ROOT')
         arcpy.management.Delete(str(pathlib.Path(self.output_folder) / 'enc_polygons.shp'))
 
+    def download_enc_zipfile(self, enc_id) -> None:
+        """
+        Download a single ENC zip file with the base cell and all update files of the current edition
+        :param str enc_id: ENC file name without extension
+        """
+
+        enc_zip = requests.get(f'https://charts.noaa.gov/ENCs/{enc_id}.zip')
+        output_file = str(pathlib.Path(self.output_folder) / f'{enc_id}.zip')
+        with open(output_file, 'wb') as file:
+            for chunk in enc_zip.iter_content(chunk_size=128):
+                file.write(chunk)
+
     def download_enc_zipfiles(self, enc_intersected) -> None:
         """
         Download all intersected ENC zip files
+        - Existing ENC files are only downloaded again when the catalog has a newer edition or update
         :param arcpy.Layer enc_intersected: Layer of intersected polygons
         """
 
@@ -76,22 +92,34 @@ class ENCDownloaderEngine(Engine):
                 downloaded = str(pathlib.Path(self.output_folder) / str(row[0] + '.000'))
                 if self.param_lookup['overwrite_files'].value:
                     arcpy.AddMessage(f'Downloading: {row[0]}')
-                    enc_zip = requests.get(f'https://charts.noaa.gov/ENCs/{row[0]}.zip')
-                    output_file = str(pathlib.Path(self.output_folder) / f'{row[0]}.zip')
-                    with open(output_file, 'wb') as file:
-                        for chunk in enc_zip.iter_content(chunk_size=128):
-                            file.write(chunk)
+                    self.download_enc_zipfile(row[0])
                 else:
                     if not os.path.exists(downloaded):
                         arcpy.AddMessage(f'Downloading: {row[0]}')
-                        enc_zip = requests.get(f'https://charts.noaa.gov/ENCs/{row[0]}.zip')
-                        output_file = str(pathlib.Path(self.output_folder) / f'{row[0]}.zip')
-                        with open(output_file, 'wb') as file:
-                            for chunk in enc_zip.iter_content(chunk_size=128):
-                                file.write(chunk)
+                        self.download_enc_zipfile(row[0])
+                    elif self.enc_file_outdated(row[0]):
+                        edition, update = self.cell_editions[row[0]]
+                        arcpy.AddMessage(f'Downloading update: {row[0]} (edition {edition}, update {update})')
+                        self.download_enc_zipfile(row[0])
                     else:
                         arcpy.AddMessage(f'File already downloaded: {row[0]}')
 
+    def enc_file_outdated(self, enc_id) -> bool:
+        """
+        Compare the edition and update of a downloaded ENC file against the ENC catalog
+        :param str enc_id: ENC file name without extension
+        :returns bool: True if the catalog has a newer edition or update
+        """
+
+        if enc_id not in self.cell_editions:
+            return False
+        catalog_edition, catalog_update = self.cell_editions[enc_id]
+        local_edition, local_update = self.get_local_edition(enc_id)
+        try:
+            return (int(catalog_edition), int(catalog_update)) > (int(local_edition), int(local_update))
+        except ValueError:
+            return (catalog_edition, catalog_update) != (local_edition, local_update)
+
     def find_intersecting_polygons(self, xml):
         """
         Obtain ENC geometry from XML and spatial query against project boundary
@@ -105,6 +133,10 @@ class ENCDownloaderEngine(Engine):
         for cell in xml_cells:
             if cell.find('status').text == 'Active':  # Ignore Cancelled status files
                 enc_id = cell.find('name').text
+                edition = cell.find('edtn')
+                update = cell.find('updn')
+                if edition is not None and update is not None:
+                    self.cell_editions[enc_id] = (edition.text, update.text)
                 coverage = cell.find('cov')
                 panels = coverage.find_all('panel')
                 panel_polygons = self.get_panel_polygons(panels)
@@ -126,6 +158,20 @@ class ENCDownloaderEngine(Engine):
         result = requests.get(path if path else self.xml_path)
         return result.content
     
+    def get_local_edition(self, enc_id) -> tuple[str, str]:
+        """
+        Read the edition and latest update number of a downloaded ENC file and its update files
+        :param str enc_id: ENC file name without extension
+        :returns tuple[str]: Edition and update numbers
+        """
+
+        enc_path = pathlib.Path(self.output_folder) / f'{enc_id}.000'
+        edition, update = get_dsid_edition(str(enc_path))
+        update_files = self.get_enc_update_files(str(enc_path))
+        if update_files:
+            update = get_dsid_edition(update_files[-1])[1]
+        return edition, update
+
     def get_panel_polygons(self, panels):
         """
         Convert the panel vertex values to polygons
@@ -145,17 +191,29 @@ class ENCDownloaderEngine(Engine):
         return polygons
     
     def move_to_output_folder(self) -> None:
-        """Move all *.000 files to the main output folder"""
+        """
+        Move all *.000 files and their .001, .002... update files to the main output folder
+        - A downloaded ENC file replaces the existing base and update files of an older edition or update
+        """
 
         output_path = pathlib.Path(self.output_folder)
         enc_folders = []
         for enc_file in output_path.rglob('*.000'):
             enc_path = pathlib.Path(enc_file)
             enc_folders.append(enc_path.stem)
-            output_enc = str(output_path / enc_path.name)
-            if not os.path.exists(output_enc):
+            if enc_path.parent == output_path:
+                continue
+            output_enc = output_path / enc_path.name
+            if os.path.exists(output_enc):
+                arcpy.AddMessage(f'Replacing: {enc_file.name}')
+                for existing_update in self.get_enc_update_files(str(output_enc)):
+                    os.remove(existing_update)
+            else:
                 arcpy.AddMessage(f'Moving: {enc_file.name}')
-                enc_path.rename(output_enc)
+            os.replace(enc_path, output_enc)
+            for update_file in self.get_enc_update_files(str(enc_path)):
+                arcpy.AddMessage(f' - Moving update: {pathlib.Path(update_file).name}')
+                os.replace(update_file, output_path / pathlib.Path(update_file).name)
         for folder in enc_folders:
             unzipped_folder = output_path / folder
             if os.path.exists(unzipped_folder):
@@ -168,11 +226,22 @@ class ENCDownloaderEngine(Engine):
         xml = self.get_enc_xml()
         enc_intersected = self.find_intersecting_polygons(xml)
         self.download_enc_zipfiles(enc_intersected)
-        self.unzip_enc_files(self.output_folder, '000')
+        self.unzip_downloaded_enc_files(self.output_folder)
         self.move_to_output_folder()
         self.cleanup_output()
         arcpy.AddMessage('Done')
 
+    def unzip_downloaded_enc_files(self, output_folder) -> None:
+        """
+        Unzip all downloaded zip files in a folder
+        - Zip files are deleted after each run, so any zip file holds a new ENC file or update
+        :param str output_folder: Folder with the downloaded zip files
+        """
+
+        for zipped_file in pathlib.Path(output_folder).glob('*.zip'):
+            with zipfile.ZipFile(zipped_file, 'r') as zipped:
+                zipped.extractall(str(pathlib.Path(output_folder) / zipped_file.stem))
+
     def verify_sheets_layer(self):
         """Convert geojson for tool to work same as shapefile"""
         
@@ -1,15 +1,20 @@
 import time
 import pathlib
-import json
 import arcpy
 import arcpy.management
 import requests
 import yaml
 import glob
 import os
+import sys
+import multiprocessing
+import contextlib
 import pyodbc
 
+from osgeo import ogr
 from csf_prf.engines.Engine import Engine
+from csf_prf.helpers.area import get_polygon_areas
+from csf_prf.helpers.tools import Param
 from csf_prf.engines.class_code_lookup import class_codes as CLASS_CODES
 arcpy.env.overwriteOutput = True
 arcpy.env.qualifiedFieldNames = False # Force use of field name alias
@@ -62,19 +67,102 @@ class ENCReaderException(Exception):
 #     else:
 #         arcpy.AddMessage(f'Already downloaded GC: {basefilename}')
 
+
+# Upper scale coverages by scale in a read worker process, set once by init_read_worker()
+worker_scale_coverages = None
+
+
+def init_read_worker(scale_coverages) -> None:
+    """
+    Store the upper scale coverages once in each read worker process
+    - ScaleCoverage rebuilds its index when it is unpickled, so it is sent once per worker instead of once per ENC file
+    :param dict[int] scale_coverages: Upper scale coverages by scale
+    """
+
+    global worker_scale_coverages
+    worker_scale_coverages = scale_coverages
+
+
+def read_enc_cell(read_inputs) -> dict:
+    """
+    Read the records of one ENC file in a worker process
+    - Standalone function because class methods can't be pickled
+    - Uses the upper scale coverages stored by init_read_worker()
+    :param list[str | bytes] read_inputs: ENC file path, ENC cache key or None and WKB Sheets envelope
+    :returns dict[str]: Records by geometry type and supersession counts for the ENC file
+    """
+
+    enc_path, enc_cache_key, sheets_envelope = read_inputs
+    engine = ENCReaderEngine(param_lookup={}, sheets_layer=None)
+    if enc_cache_key:
+        # Reuse the key already built by the main process
+        engine.enc_cache_keys[enc_path] = enc_cache_key
+    engine.scale_coverages = worker_scale_coverages
+    engine.sheets_envelope = sheets_envelope
+    engine.set_feature_lookup()
+    return engine.read_enc_cell(enc_path)
+
+
+def run_geometry_pipeline(pipeline_inputs) -> tuple[str, list]:
+    """
+    Filter, attribute and write the records of one geometry type in a worker process
+    - Standalone function because class methods can't be pickled
+    - Each worker has its own memory workspace and writes to its own geodatabase
+    :param list[str | list | PreparedSheets | bool] pipeline_inputs: Geometry type, feature and QUAPOS records, prepared Sheets, output folder and layer file export option
+    :returns tuple[str, list]: Path to the worker geodatabase and the feature type, assignment, name and path of each feature class written to it
+    """
+
+    geom_type, features, quapos, prepared_sheets, output_folder, layerfile_export = pipeline_inputs
+    param_lookup = {'output_folder': Param(output_folder), 'layerfile_export': Param(layerfile_export)}
+    engine = ENCReaderEngine(param_lookup, sheets_layer=None, prepared_sheets=prepared_sheets)
+    engine.gdb_name = f'{engine.gdb_name}_{geom_type}'
+    engine.geometries = {geom_type: engine.geometries[geom_type]}
+    engine.geometries[geom_type]['features'] = features
+    engine.geometries[geom_type]['QUAPOS'] = quapos
+    engine.create_output_gdb(engine.gdb_name)
+    engine.set_sheets_envelope()
+    engine.perform_spatial_filter()
+    engine.add_columns()
+    engine.convert_noaa_attributes()
+    feature_types = ('features', 'QUAPOS')
+    engine.export_enc_layers(feature_types)
+    outputs = []
+    for feature_type in feature_types:
+        for assignment in ['assigned', 'unassigned']:
+            output_name = f'{geom_type}_{feature_type}_{assignment}'
+            if output_name in engine.output_data:
+                outputs.append((feature_type, assignment, output_name, engine.output_data[output_name]))
+    return os.path.join(output_folder, engine.gdb_name + '.geodatabase'), outputs
+
+
 class ENCReaderEngine(Engine):
     """
     Class for handling all reading and processing
     of features from ENC files
     """
 
-    def __init__(self, param_lookup: dict, sheets_layer):
+    # Set above 1 to read multiple ENC files in a pool of worker processes
+    processes = 1
+    # Set True to write the records of each ENC file to the memory layers as soon as it is read
+    # instead of holding the records of every ENC file in memory
+    stream_records = False
+    # Set True to filter, attribute and write the Point, LineString and Polygon records
+    # in three worker processes once every ENC file is read
+    geometry_processes = False
+
+    def __init__(self, param_lookup: dict, sheets_layer, prepared_sheets=None):
         self.param_lookup = param_lookup
         self.sheets_layer = sheets_layer
+        self.prepared_sheets = prepared_sheets
         self.gdb_name = 'csf_features'
-        self.driver = None
-        self.scale_bounds = {}
+        self.scale_coverages = {}
+        self.scale_extents = {}
+        self.enc_cache_keys = {}
+        self.sheets_envelope = None
+        self.sheets_coverage = None
+        self.sheets_buffer_coverage = None
         self.feature_lookup = None
+        self.objl_names = {objl_name for objl_name, _ in CLASS_CODES.values() if objl_name}
         self.gc_files = set()
         self.gc_points = None
         self.gc_lines = None
@@ -178,6 +266,7 @@ class ENCReaderEngine(Engine):
             for value in ['assigned', 'unassigned']:
                 arcpy.AddMessage(f'Update field values for: {feature_type} - {value}')
                 invalid_field_names = set()
+                text_lengths = self.get_text_lengths(self.geometries[feature_type]['features_layers'][value])
                 with arcpy.da.UpdateCursor(self.geometries[feature_type]['features_layers'][value], ['*']) as updateCursor:
                     fields = updateCursor.fields
                     for row in updateCursor:
@@ -189,10 +278,10 @@ class ENCReaderEngine(Engine):
                                 if current_value:
                                     try:
                                         new_value = s57_lookup[field_name][int(current_value)]
-                                        new_row.append(new_value)
+                                        new_row.append(self.truncate_text(new_value, text_lengths.get(field_name)))
                                     except ValueError as e: # current_value has multiple values
                                         multiple_value_result = self.get_multiple_values_from_field(field_name, current_value, s57_lookup)
-                                        new_row.append(multiple_value_result)
+                                        new_row.append(self.truncate_text(multiple_value_result, text_lengths.get(field_name)))
                                         pass
                                     except KeyError as e: # current_value is invalid ie. 2147483641
                                         new_row.append(current_value)
@@ -206,6 +295,30 @@ class ENCReaderEngine(Engine):
                 if len(invalid_field_names) > 0:
                     arcpy.AddMessage(f' - fields with invalid values: {invalid_field_names}')
 
+    def create_record_layers(self, feature_type, fields) -> dict[str]:
+        """
+        Create the assigned and unassigned memory layers that feature or QUAPOS records are written to
+        :param str feature_type: 'features' or 'QUAPOS'
+        :param dict[str] fields: Sorted field names by geometry type
+        :returns dict[str]: Assigned and unassigned memory layers by geometry type
+        """
+
+        layer_shapes = {'Point': ('points', 'POINT'), 'LineString': ('lines', 'POLYLINE'), 'Polygon': ('polygons', 'POLYGON')}
+        record_layers = {}
+        for geom_type in self.geometries:
+            layer_name, shape_type = layer_shapes[geom_type]
+            record_layers[geom_type] = {}
+            for assignment in ['assigned', 'unassigned']:
+                record_layer = arcpy.management.CreateFeatureclass(
+                    'memory', 
+                    f'{feature_type}_{layer_name}_{assignment}', shape_type, spatial_reference=arcpy.SpatialReference(4326))
+                # Add every typed field in one call instead of one AddField per field
+                if fields[geom_type]:
+                    arcpy.management.AddFields(record_layer, self.get_field_definitions(fields[geom_type]))
+                record_layers[geom_type][assignment] = record_layer
+            self.geometries[geom_type][f'{feature_type}_layers'] = record_layers[geom_type]
+        return record_layers
+
     def download_gc(self, number, download_inputs) -> None:
         """
         Download a specific geograhic cell associated with an ENC
@@ -270,19 +383,37 @@ class ENCReaderEngine(Engine):
             arcpy.AddMessage(f' - Remove unzipped: {gc_file.name}')
             gc_file.unlink()
 
-    def export_enc_layers(self) -> None:
+    def enc_covers_sheets(self, coverage_records, sheets_envelope) -> bool:
+        """
+        Check if the M_COVR coverage of an ENC file can touch the Sheets envelope
+        - ENC files without an M_COVR coverage are always read
+        :param list[dict] coverage_records: M_COVR records of the ENC file
+        :param ogr.Geometry sheets_envelope: Envelopes of the Sheets buffered by 1km
+        :returns bool: True if the ENC file needs to be read
+        """
+
+        no_coverage = True
+        for record in coverage_records:
+            if record['properties'].get('CATCOV') == 1 and record['geometry']:
+                if ogr.CreateGeometryFromWkb(record['geometry']).Intersects(sheets_envelope):
+                    return True
+                no_coverage = False
+        return no_coverage
+
+    def export_enc_layers(self, feature_types=('features', 'GC', 'QUAPOS')) -> None:
         """
         Write out assigned and unassigned layers to output folder
         - SpatialJoin adds file name to attributes if performed on an "memory" layer
         - Copying features out to disk to force use of alias names for attributes to work with layerfile
         - # Could also just create static layers initially instead of "memory" in perform_spatial_filter()
+        :param tuple[str] feature_types: Layers to write out, any of features, GC and QUAPOS
         """
 
         arcpy.AddMessage(f'Writing output feature classes')
         arcpy.env.qualifiedFieldNames = False
         output_folder = str(self.param_lookup['output_folder'].valueAsText)
         for geom_type in self.geometries.keys():
-            for feature_type in ['features', 'GC', 'QUAPOS']:
+            for feature_type in feature_types:
                 assigned_name = f'{geom_type}_{feature_type}_assigned'
                 if self.geometries[geom_type][f'{feature_type}_layers']['assigned']:
                     arcpy.AddMessage(f' - {assigned_name}')
@@ -297,20 +428,32 @@ class ENCReaderEngine(Engine):
                     arcpy.management.CopyFeatures(self.geometries[geom_type][f'{feature_type}_layers']['unassigned'], output_name)
                     self.output_data[f'{unassigned_name}'] = output_name
     
+    def filter_cached_records(self, records, sheets_envelope):
+        """
+        Iterate cached records that touch the Sheets envelope
+        :param list[dict] records: Records of one cached ENC layer
+        :param ogr.Geometry sheets_envelope: Envelopes of the Sheets buffered by 1km, None to keep every record
+        :returns Generator[dict]: Cached records
+        """
+
+        for record in records:
+            if sheets_envelope is None or ogr.CreateGeometryFromWkb(record['geometry']).Intersects(sheets_envelope):
+                yield record
+
     def filter_gc_features(self) -> None:
         """Spatial query GC features within Sheets layer"""
 
         # TODO Run tool and see if GC_layers are identical to features from ENC files
         # TODO is supersession an issue with GC features?
         if self.gc_points:
-            points_assigned = arcpy.management.SelectLayerByLocation(self.gc_points, 'INTERSECT', self.sheets_layer)
+            points_assigned = self.select_sheets_features(self.gc_points)
             points_assigned_layer = arcpy.management.MakeFeatureLayer(points_assigned)
             points_unassigned = arcpy.management.SelectLayerByLocation(points_assigned_layer, selection_type='SWITCH_SELECTION')
             self.geometries['Point']['GC_layers']['assigned'] = points_assigned
             self.geometries['Point']['GC_layers']['unassigned'] = points_unassigned 
         
         if self.gc_lines:
-            lines_assigned = arcpy.management.SelectLayerByLocation(self.gc_lines, 'INTERSECT', self.sheets_layer)
+            lines_assigned = self.select_sheets_features(self.gc_lines)
             lines_assigned_layer = arcpy.management.MakeFeatureLayer(lines_assigned)
             lines_unassigned = arcpy.management.SelectLayerByLocation(lines_assigned_layer, selection_type='SWITCH_SELECTION')
             self.geometries['LineString']['GC_layers']['assigned'] = lines_assigned
@@ -332,47 +475,84 @@ class ENCReaderEngine(Engine):
                                     f'PWD={translate_auth};')
         return connection.cursor()
     
-    def get_feature_records(self) -> None:
-        """Read and store all features from ENC file"""
+    def get_cell_records(self, batch_size=None):
+        """
+        Read the records of each ENC file, in a pool of worker processes when processes is above 1
+        :param int batch_size: Number of ENC files read before their records are returned, None for all files
+        :returns Generator[dict]: Records by geometry type and supersession counts for each ENC file
+        """
 
-        arcpy.AddMessage(' - Reading Feature records')
         enc_files = self.get_approved_enc_files()
+        if self.processes > 1 and len(enc_files) > 1:
+            arcpy.AddMessage(f'  - Reading {len(enc_files)} ENC files with {self.processes} processes')
+            if sys.platform == 'win32':
+                multiprocessing.set_executable(os.path.join(sys.exec_prefix, 'pythonw.exe'))
+            batch_size = batch_size or len(enc_files)
+            with multiprocessing.Pool(processes=min(self.processes, len(enc_files)), 
+                                      initializer=init_read_worker, initargs=(self.scale_coverages,)) as pool:
+                for batch_start in range(0, len(enc_files), batch_size):
+                    batch_files = enc_files[batch_start:batch_start + batch_size]
+                    # map() returns results in enc_files order so output matches a serial read
+                    yield from pool.map(read_enc_cell, [(enc_path, self.enc_cache_keys.get(enc_path), self.sheets_envelope) 
+                                                      for enc_path in batch_files])
+        else:
+            for enc_path in enc_files:
+                yield self.read_enc_cell(enc_path)
+
+    def get_cursor_fields(self, geom_type, fields) -> list[str]:
+        """
+        Build the InsertCursor fields for a record layer
+        :param str geom_type: Point, LineString or Polygon
+        :param list[str] fields: Sorted field names of the record layer
+        :returns list[str]: Geometry token followed by the field names
+        """
+
+        # Points are written from WKB coordinates, lines and polygons straight from WKB bytes
+        return ['SHAPE@XY' if geom_type == 'Point' else 'SHAPE@WKB'] + fields
+
+    def get_enc_records(self) -> None:
+        """Read and store all feature and QUAPOS vector records from each ENC file in a single pass"""
+
+        arcpy.AddMessage(' - Reading Feature and QUAPOS records')
         intersected = 0
-        for enc_path in enc_files:
-            enc_file = self.open_file(enc_path)
-            enc_scale = pathlib.Path(enc_path).stem[2]
-            for layer in enc_file:
-                layer.ResetReading()
-                # features_missing_coords = 0
-                for feature in layer:
-                    if feature:
-                        feature_json = json.loads(feature.ExportToJson())
-                        if self.feature_covered_by_upper_scale(feature_json, int(enc_scale)):
-                            intersected += 1
-                            continue
-                        
-                        feature_json['properties']['SCALE_LVL'] = enc_scale
-                        geom_type = feature_json['geometry']['type'] if feature_json['geometry'] else False
-                        if geom_type in ['Point', 'LineString', 'Polygon'] and feature_json['geometry']['coordinates']:
-                            if self.unapproved(geom_type, feature_json['properties']):
-                                continue
-
-                            feature_json = self.set_none_to_null(feature_json)
-                            feature_json['properties'] = self.convert_illegal_chars(feature_json['properties'])
-                            self.geometries[geom_type]['features'].append({'geojson': feature_json, 'scale': enc_scale})
-                        # elif geom_type == 'MultiPoint':
-                        #     # MultiPoints are broken up now to single features with an ENV variable
-                        #     feature_template = json.loads(feature.ExportToJson())
-                        #     feature_template['geometry']['type'] = 'Point'
-                        #     for point in feature.geometry():
-                        #         feature_template['geometry']['coordinates'] = [point.GetX(), point.GetY()]  # XY
-                        #         self.geometries['Point']['features'].append({'geojson': feature_template})     
-                        # else:
-                        #     if geom_type:
-                        #         features_missing_coords += 1
-                # if features_missing_coords > 0:
-                #     arcpy.AddMessage(f"Found ({features_missing_coords}) features but missing coordinates")
+        vectors_intersected = 0
+        pruned = 0
+        cell_coverages = {'covered': 0, 'clear': 0, 'partial': 0}
+        for records in self.get_cell_records():
+            for geom_type in self.geometries:
+                self.geometries[geom_type]['features'].extend(records['features'][geom_type])
+                self.geometries[geom_type]['QUAPOS'].extend(records['QUAPOS'][geom_type])
+            intersected += records['intersected']
+            vectors_intersected += records['vectors_intersected']
+            pruned += records['pruned']
+            if records['cell_coverage']:
+                cell_coverages[records['cell_coverage']] += 1
+        arcpy.AddMessage(f'  - Skipped {pruned} ENC files outside of 1km from Sheets')
+        self.print_cell_coverages(cell_coverages)
         arcpy.AddMessage(f'  - Removed {intersected} supersession features')
+        arcpy.AddMessage(f'  - Removed {vectors_intersected} supersession QUAPOS features')
+
+    def get_layer_rules(self, objl_name: str) -> dict[str]:
+        """
+        Resolve the unapproved checks of an S57 feature layer before any feature is read
+        - True or False when every feature of a geometry type is unapproved or approved
+        - None when the feature attributes are needed for the subcategory check
+        :param str objl_name: S57 layer name, which is the OBJL acronym
+        :returns dict[str]|None: Unapproved check by geometry type, None for layers that aren't an OBJL
+        """
+
+        if objl_name not in self.objl_names:
+            return None
+
+        rules = {}
+        for geom_type in self.geometries:
+            if objl_name in ['MORFAC', 'SLCONS']:
+                rules[geom_type] = None
+            elif objl_name in self.get_unapproved_names():
+                rules[geom_type] = self.unapproved_subcategory(geom_type, objl_name, {})
+            else:
+                rules[geom_type] = objl_name in self.feature_lookup[geom_type]
+        return rules
 
     def get_translated_mcd_auth(self, key, auth):
         """Obtain MCD information"""
@@ -386,6 +566,24 @@ class ENCReaderEngine(Engine):
 
         return ['MORFAC', 'SLCONS', 'UWTROC', 'WRECKS']
     
+    def layer_record_unapproved(self, layer_name: str, layer_rules: dict[str], record: dict) -> bool:
+        """
+        Check if a feature record is removed before supersession
+        :param str layer_name: OBJL acronym of the ENC layer
+        :param dict[str] layer_rules: Layer level rules from get_layer_rules(), None for layers without rules
+        :param dict record: Feature record
+        :returns bool: True if the record has no usable geometry or is unapproved
+        """
+
+        geom_type = record['type']
+        if geom_type not in ['Point', 'LineString', 'Polygon']:
+            return True
+        if layer_rules is None:
+            return self.unapproved(geom_type, record['properties'])
+        elif layer_rules[geom_type] is None:
+            return self.unapproved_subcategory(geom_type, layer_name, record['properties'])
+        return layer_rules[geom_type]
+
     def merge_gc_features(self) -> None:
         """Read and store all features from GC shapefiles"""
 
@@ -410,6 +608,22 @@ class ENCReaderEngine(Engine):
         if line_files:
             self.gc_lines = arcpy.management.Merge(line_files, 'memory/gc_lines')
 
+    def merge_geometry_outputs(self, geom_type, worker_gdb, outputs) -> None:
+        """
+        Copy the feature classes of a geometry type worker into the output geodatabase and remove the worker geodatabase
+        :param str geom_type: Point, LineString or Polygon
+        :param str worker_gdb: Path to the worker geodatabase
+        :param list[tuple[str]] outputs: Feature type, assignment, name and path of each feature class from run_geometry_pipeline()
+        """
+
+        output_gdb = os.path.join(str(self.param_lookup['output_folder'].valueAsText), self.gdb_name + '.geodatabase')
+        for feature_type, assignment, output_name, worker_layer in outputs:
+            output_path = os.path.join(output_gdb, output_name)
+            arcpy.management.CopyFeatures(worker_layer, output_path)
+            self.output_data[output_name] = output_path
+            self.geometries[geom_type][f'{feature_type}_layers'][assignment] = output_path
+        arcpy.management.Delete(worker_gdb)
+
     def get_gc_data(self) -> None:
         """Start the process to download any GCs associated with input ENCs"""
         
@@ -419,6 +633,58 @@ class ENCReaderEngine(Engine):
         # TODO create new method for string replacement if needed, ie: list of ENC #'s for where clause
         return self.run_query(cursor, sql)
 
+    def get_record_writer(self, writer, assignment_layers, geom_type, records) -> dict:
+        """
+        Open the InsertCursors and row builder of a record layer once, reopening them only when records bring new fields
+        - Fields are gathered from the records as they are read instead of reading every ENC file up front
+        :param dict|None writer: Current writer of the record layer, None before its first records
+        :param dict[str] assignment_layers: Assigned and unassigned memory layers of the geometry type
+        :param str geom_type: Point, LineString or Polygon
+        :param list[dict] records: Feature or QUAPOS records about to be written
+        :returns dict[str]: Fields, cursors, row builder and cursor ExitStack of the record layer
+        """
+
+        current_fields = writer['fields'] if writer else set()
+        fields = current_fields | self.get_all_fields(records)
+        if writer and fields == current_fields:
+            return writer
+        if writer:
+            # Fields can only be added once the cursors release their locks
+            writer['cursor_stack'].close()
+        field_definitions = self.get_field_definitions(sorted(fields - current_fields))
+        for record_layer in assignment_layers.values():
+            arcpy.management.AddFields(record_layer, field_definitions)
+        cursor_fields = self.get_cursor_fields(geom_type, sorted(fields))
+        cursor_stack = contextlib.ExitStack()
+        cursors = {assignment: cursor_stack.enter_context(arcpy.da.InsertCursor(record_layer, cursor_fields, explicit=True))
+                   for assignment, record_layer in assignment_layers.items()}
+        return {'fields': fields, 'cursors': cursors, 'build_row': self.get_row_writer(cursor_fields), 'cursor_stack': cursor_stack}
+
+    def get_large_lndare_indices(self, records: list[dict]) -> set[int]:
+        """
+        Find the LNDARE polygons with an area > 3775m in one vectorized call
+        - Areas are computed in North America Albers Equal Area from the record WKB
+        :param list[dict] records: Polygon feature records
+        :returns set[int]: Indices of the large LNDARE records
+        """
+
+        lndare_indices = [index for index, feature in enumerate(records) 
+                          if feature['geometry'] and CLASS_CODES.get(int(feature['properties']['OBJL']))[0] == 'LNDARE']
+        polygon_areas = get_polygon_areas([records[index]['geometry'] for index in lndare_indices])
+        return {index for index, polygon_area in zip(lndare_indices, polygon_areas) if polygon_area > 3775}
+
+    def get_sheet_assignments(self, geometries) -> list[str]:
+        """
+        Assign records to the Sheets with the indexed Sheets polygons instead of selecting by location
+        :param list[bytes] geometries: WKB geometries of the records
+        :returns list[str]: assigned if a record intersects a Sheet, unassigned if it is within 1km of a Sheet, otherwise outside
+        """
+
+        assigned = self.sheets_coverage.intersects_all(geometries)
+        buffered = self.sheets_buffer_coverage.intersects_all(geometries)
+        return ['assigned' if inside_sheet else 'unassigned' if inside_buffer else 'outside' 
+                for inside_sheet, inside_buffer in zip(assigned, buffered)]
+
     def get_sql(self, file_name: str) -> str:
         """
         Retrieve SQL query in string format
@@ -433,42 +699,43 @@ class ENCReaderEngine(Engine):
                     return sql.read()   
         raise ENCReaderException(f'SQL file not found: {file_name}.sql')
 
-    def get_vector_records(self) -> None:
-        """Read and store all vector records with QUAPOS from ENC file"""
-
-        arcpy.AddMessage(' - Reading QUAPOS records')
-        enc_files = self.get_approved_enc_files()
-        intersected = 0
-        for enc_path in enc_files:
-            enc_file = self.open_file(enc_path)
-            enc_scale = pathlib.Path(enc_path).stem[2]
-            for layer in enc_file:
-                layer.ResetReading()
-                # features_missing_coords = 0
-                for feature in layer:
-                    if feature:
-                        feature_json = json.loads(feature.ExportToJson())
-                        if self.feature_covered_by_upper_scale(feature_json, int(enc_scale)):
-                            intersected += 1
-                            continue
+    def insert_records(self, cursors, build_row, geom_type, records, remove_outside=False) -> tuple[int, int]:
+        """
+        Write records to the assigned or unassigned record layer in one pass
+        - LNDARE polygons with an area > 3775m are skipped
+        :param dict[arcpy.da.InsertCursor] cursors: Assigned and unassigned cursors with fields from ENCReaderEngine.get_cursor_fields()
+        :param function build_row: Row builder for the cursor fields; see Engine.get_row_writer()
+        :param str geom_type: Point, LineString or Polygon
+        :param list[dict] records: Feature or QUAPOS records of the geometry type
+        :param bool remove_outside: Skip records that are outside of 1km from Sheets instead of writing them as unassigned
+        :returns tuple[int]: Number of skipped LNDARE polygons and number of skipped records outside of 1km from Sheets
+        """
 
-                        feature_json['properties']['SCALE_LVL'] = enc_scale
-                        if 'QUAPOS' in feature_json['properties'] and feature_json['properties']['QUAPOS'] is not None:
-                            geom_type = feature_json['geometry']['type'] if feature_json['geometry'] else False  
-                            if geom_type in ['Point', 'LineString', 'Polygon'] and feature_json['geometry']['coordinates']:
-                                self.geometries[geom_type]['QUAPOS'].append({'geojson': feature_json, 'scale': enc_scale})
-                            # elif geom_type == 'MultiPoint':  # TODO do we need MultiPoint 'QUAPOS' features?
-                            #     feature_template = json.loads(feature.ExportToJson())
-                            #     feature_template['geometry']['type'] = 'Point'
-                            #     for point in feature.geometry():
-                            #         feature_template['geometry']['coordinates'] = [point.GetX(), point.GetY()]  # XY
-                            #         self.geometries['Point']['QUAPOS'].append({'geojson': feature_template})
-                #             else:
-                #                 if geom_type:
-                #                     features_missing_coords += 1
-                # if features_missing_coords > 0:
-                    # arcpy.AddMessage(f"Found ({features_missing_coords}) QUAPOS features but missing coordinates")
-        arcpy.AddMessage(f'  - Removed {intersected} supersession QUAPOS features')
+        large_lndare = 0
+        outside = 0
+        sheet_assignments = self.get_sheet_assignments([feature['geometry'] for feature in records])
+        large_lndare_indices = self.get_large_lndare_indices(records) if geom_type == 'Polygon' else set()
+        for index, (feature, sheet_assignment) in enumerate(zip(records, sheet_assignments)):
+            if sheet_assignment == 'outside' and remove_outside:
+                outside += 1
+                continue
+            cursor = cursors['assigned'] if sheet_assignment == 'assigned' else cursors['unassigned']
+            if geom_type == 'Point':
+                geometry = self.get_point_xy(feature['geometry'])
+            elif geom_type == 'LineString':
+                geometry = feature['geometry']
+            else:
+                if not feature['geometry']:
+                    continue
+                # skip LNDARE > 3775
+                if index in large_lndare_indices:
+                    large_lndare += 1
+                    continue
+                # WKB holds the outer ring and any inner rings
+                geometry = feature['geometry']
+
+            cursor.insertRow(build_row(geometry, feature['properties']))
+        return large_lndare, outside
 
     def join_quapos_to_features(self) -> None:
         """Spatial join the QUAPOS tables to features tables"""
@@ -511,134 +778,23 @@ class ENCReaderEngine(Engine):
 
         for feature_type in ['features', 'QUAPOS']:
             arcpy.AddMessage(f' - Filtering {feature_type} records')
-
-            # POINTS
-            point_fields = self.get_all_fields(self.geometries['Point'][feature_type])
-            points_layer = arcpy.management.CreateFeatureclass(
-                'memory', 
-                f'{feature_type}_points_assigned', 'POINT', spatial_reference=arcpy.SpatialReference(4326))
-            sorted_point_fields = sorted(point_fields)
-            for field in sorted_point_fields:
-                arcpy.management.AddField(points_layer, field, 'TEXT', field_length=300, field_is_nullable='NULLABLE')
-
-            arcpy.AddMessage(' - Building Point features')     
-            # 1. add geometry to fields
-            cursor_fields = ['SHAPE@XY'] + sorted_point_fields
-            with arcpy.da.InsertCursor(points_layer, cursor_fields, explicit=True) as point_cursor: 
-                for feature in self.geometries['Point'][feature_type]:
-                    # Make new list all set to empty string.  Using None would leave some different
-                    attribute_values = ['' for i in range(len(cursor_fields))]
-                    # Set geometry on first index
-                    coords = feature['geojson']['geometry']['coordinates']
-                    attribute_values[0] = (coords[0], coords[1])
-                    # Set attributes based on index
-                    for fieldname, attr in list(feature['geojson']['properties'].items()):
-                        field_index = point_cursor.fields.index(fieldname)
-                        attribute_values[field_index] = str(attr)
-                    # add to cursor
-                    point_cursor.insertRow(attribute_values)
-            
-            # Must create separate layer name for unassigned.  Using same layer name will cause cursor to open the same layer.
-            points_unassigned_rename = arcpy.management.CopyFeatures(points_layer, fr'memory\{feature_type}_points_unassigned')
-
-            points_assigned = arcpy.management.SelectLayerByLocation(points_layer, 'INTERSECT', self.sheets_layer)
-            points_unassigned = arcpy.management.SelectLayerByLocation(points_unassigned_rename, 'INTERSECT', self.sheets_layer, invert_spatial_relationship='INVERT')
-            self.geometries['Point'][f'{feature_type}_layers']['assigned'] = points_assigned
-            self.geometries['Point'][f'{feature_type}_layers']['unassigned'] = points_unassigned
-            
-            # LINES
-            line_fields = self.get_all_fields(self.geometries['LineString'][feature_type])
-            lines_layer = arcpy.management.CreateFeatureclass(
-                'memory', 
-                f'{feature_type}_lines_assigned', 'POLYLINE', spatial_reference=arcpy.SpatialReference(4326))
-            sorted_line_fields = sorted(line_fields)
-            for field in sorted_line_fields:
-                arcpy.management.AddField(lines_layer, field, 'TEXT', field_length=300, field_is_nullable='NULLABLE')
-
-            arcpy.AddMessage(' - Building Line features')
-            cursor_fields = ['SHAPE@JSON'] + sorted_line_fields
-            with arcpy.da.InsertCursor(lines_layer, cursor_fields, explicit=True) as line_cursor: 
-                for feature in self.geometries['LineString'][feature_type]:
-                    attribute_values = ['' for i in range(len(cursor_fields))]
-                    geometry = feature['geojson']['geometry']
-                    attribute_values[0] = arcpy.AsShape(geometry).JSON
-                    for fieldname, attr in list(feature['geojson']['properties'].items()):
-                        field_index = line_cursor.fields.index(fieldname)
-                        attribute_values[field_index] = str(attr)
-                    line_cursor.insertRow(attribute_values)
-            lines_unassigned_rename = arcpy.management.CopyFeatures(lines_layer, fr'memory\{feature_type}_lines_unassigned')
-
-            lines_assigned = arcpy.management.SelectLayerByLocation(lines_layer, 'INTERSECT', self.sheets_layer)
-            lines_unassigned = arcpy.management.SelectLayerByLocation(lines_unassigned_rename, 'INTERSECT', self.sheets_layer, invert_spatial_relationship='INVERT')
-            self.geometries['LineString'][f'{feature_type}_layers']['assigned'] = lines_assigned
-            self.geometries['LineString'][f'{feature_type}_layers']['unassigned'] = lines_unassigned
-
-            # POLYGONS
-            polygons_fields = self.get_all_fields(self.geometries['Polygon'][feature_type])
-            polygons_layer = arcpy.management.CreateFeatureclass(
-                'memory', 
-                f'{feature_type}_polygons_assigned', 'POLYGON', spatial_reference=arcpy.SpatialReference(4326))
-            sorted_polygon_fields = sorted(polygons_fields)
-            for field in sorted_polygon_fields:
-                arcpy.management.AddField(polygons_layer, field, 'TEXT', field_length=300, field_is_nullable='NULLABLE')
-
-            arcpy.AddMessage(' - Building Polygon features')
-            cursor_fields = ['SHAPE@'] + sorted_polygon_fields
-            with arcpy.da.InsertCursor(polygons_layer, cursor_fields, explicit=True) as polygons_cursor: 
-                large_lndare = 0
-                for feature in self.geometries['Polygon'][feature_type]:
-                    attribute_values = ['' for i in range(len(cursor_fields))]
-                    polygons = feature['geojson']['geometry']['coordinates']
-                    if polygons:
-                        # 1 polygon is single, > 1 is outer and inners
-                        point_arrays = arcpy.Array()
-                        for polygon in polygons:
-                            points = []
-                            for point in polygon:
-                                points.append(arcpy.Point(*point))
-                            points.append(arcpy.Point(*polygon[0]))  # close the polygon
-                            point_arrays.add(arcpy.Array(points))
-                        attribute_values[0] = arcpy.Polygon(point_arrays, arcpy.SpatialReference(4326))
-                        
-                        # skip LNDARE > 3775
-                        objl_string = CLASS_CODES.get(int(feature['geojson']['properties']['OBJL']))[0]
-                        if objl_string == 'LNDARE':
-                            polygon_area = attribute_values[0].projectAs(arcpy.SpatialReference(102008)).area
-                            if polygon_area > 3775:
-                                # arcpy.AddMessage(f'- Skipping LNDARE: {polygon_area}')
-                                large_lndare += 1
-                                continue
-
-                        for fieldname, attr in list(feature['geojson']['properties'].items()):
-                            field_index = polygons_cursor.fields.index(fieldname)
-                            attribute_values[field_index] = str(attr)
-                        polygons_cursor.insertRow(attribute_values)
-
-                        # TODO this loads all polygons in a multipolygon
-                        # FME 2018_CompositeSource_Creator.fmw comes up with 958(130), 22(1066), 108(980)
-                        # This code blocked comes up with 960, 22, 126 - 2 extra points and the multipolygons extracted
-                        # first polygon is extent boundary
-                        # if len(polygons) > 1:
-                        #     for polygon in polygons:
-                        #         points = [arcpy.Point(coord[0], coord[1]) for coord in polygon]
-                        #         coord_array = arcpy.Array(points)
-                        #         geometry = arcpy.Polygon(coord_array, arcpy.SpatialReference(4326))
-                        #         attribute_values = [str(attr) for attr in list(feature['geojson']['properties'].values())]
-                        #         polygons_cursor.insertRow([geometry] + attribute_values)
-                        # else:
-                        #     # add single polygon
-                        #     points = [arcpy.Point(coord[0], coord[1]) for coord in polygons[0]]
-                        #     coord_array = arcpy.Array(points)
-                        #     geometry = arcpy.Polygon(coord_array, arcpy.SpatialReference(4326))
-                        #     attribute_values = [str(attr) for attr in list(feature['geojson']['properties'].values())]
-                        #     polygons_cursor.insertRow([geometry] + attribute_values)
-            arcpy.AddMessage( f' - Removed {large_lndare} LNDARE features with area > 3775m')
-            polygons_unassigned_rename = arcpy.management.CopyFeatures(polygons_layer, fr'memory\{feature_type}_polygons_unassigned')
-
-            polygons_assigned = arcpy.management.SelectLayerByLocation(polygons_layer, 'INTERSECT', self.sheets_layer)
-            polygons_unassigned = arcpy.management.SelectLayerByLocation(polygons_unassigned_rename, 'INTERSECT', self.sheets_layer, invert_spatial_relationship='INVERT')
-            self.geometries['Polygon'][f'{feature_type}_layers']['assigned'] = polygons_assigned
-            self.geometries['Polygon'][f'{feature_type}_layers']['unassigned'] = polygons_unassigned
+            fields = {geom_type: sorted(self.get_all_fields(self.geometries[geom_type][feature_type])) for geom_type in self.geometries}
+            record_layers = self.create_record_layers(feature_type, fields)
+            for geom_type, assignment_layers in record_layers.items():
+                arcpy.AddMessage(f' - Building {geom_type} features')
+                cursor_fields = self.get_cursor_fields(geom_type, fields[geom_type])
+                with arcpy.da.InsertCursor(assignment_layers['assigned'], cursor_fields, explicit=True) as assigned_cursor, \
+                     arcpy.da.InsertCursor(assignment_layers['unassigned'], cursor_fields, explicit=True) as unassigned_cursor:
+                    cursors = {'assigned': assigned_cursor, 'unassigned': unassigned_cursor}
+                    # Assigned and unassigned layers share the same fields
+                    build_row = self.get_row_writer(cursor_fields)
+                    # Unassigned features outside of 1km from Sheets are removed before they are written
+                    large_lndare, outside = self.insert_records(cursors, build_row, geom_type, self.geometries[geom_type][feature_type], 
+                                                                remove_outside=feature_type == 'features')
+                if feature_type == 'features':
+                    arcpy.AddMessage(f' - Removed {outside} unassigned {geom_type} features outside of 1km')
+                if geom_type == 'Polygon':
+                    arcpy.AddMessage( f' - Removed {large_lndare} LNDARE features with area > 3775m')
 
     def print_feature_total(self) -> None:
         """Print total number of assigned/unassigned features from ENC file"""
@@ -660,37 +816,113 @@ class ENCReaderEngine(Engine):
 
         for feature_type in self.geometries.keys():
             for feature in self.geometries[feature_type]:
-                arcpy.AddMessage(f"\n - {feature['type']}:{feature['geojson']}")
+                arcpy.AddMessage(f"\n - {feature['type']}:{feature['properties']}")
 
-    def remove_unassigned_buffer(self) -> None:
-        """Remove unassigned features that are outside of 1km from Sheets boundary"""
-        
-        output_folder = self.param_lookup['output_folder'].valueAsText
-        unassigned_buffer = arcpy.analysis.Buffer(self.sheets_layer, os.path.join(output_folder, self.gdb_name + '.geodatabase', 'sheets_buffer'), '1 kilometers')
+    def read_enc_cell(self, enc_path) -> dict:
+        """
+        Read the approved feature and QUAPOS vector records of a single ENC file
+        :param str enc_path: Path to an ENC file on disk
+        :returns dict[str]: Records by geometry type and supersession counts for the ENC file
+        """
 
-        # Create list from buffer cursor iterator to use it over and over
-        # Iterator by default would only work once
-        buffer_cursor = [row for row in arcpy.da.UpdateCursor(unassigned_buffer, ["SHAPE@"])]
+        records = {
+            'features': {geom_type: [] for geom_type in self.geometries},
+            'QUAPOS': {geom_type: [] for geom_type in self.geometries},
+            'intersected': 0,
+            'vectors_intersected': 0,
+            'pruned': 0,
+            'cell_coverage': None
+        }
+        enc_scale = pathlib.Path(enc_path).stem[2]
+        sheets_envelope = ogr.CreateGeometryFromWkb(self.sheets_envelope) if self.sheets_envelope else None
+        cell = self.get_enc_cell(enc_path)
+        if cell:
+            coverage_records = cell['coverage']
+        else:
+            enc_file = self.open_enc_file(enc_path, 'records')
+            coverage_layer = enc_file.GetLayerByName('M_COVR')
+            coverage_records = list(self.get_layer_records(coverage_layer)) if coverage_layer is not None else []
+        if sheets_envelope is not None and not self.enc_covers_sheets(coverage_records, sheets_envelope):
+            records['pruned'] = 1
+            return records
+        records['cell_coverage'] = self.get_cell_coverage(coverage_records, int(enc_scale))
+        if records['cell_coverage'] == 'covered':
+            return records
+        check_supersession = records['cell_coverage'] == 'partial'
+
+        if cell:
+            enc_layers = [(layer['name'], layer['geometry_types'], self.filter_cached_records(layer['records'], sheets_envelope)) 
+                          for layer in cell['layers']]
+        else:
+            enc_layers = []
+            for layer_index in range(enc_file.GetLayerCount()):
+                layer = enc_file.GetLayer(layer_index)
+                # Unassigned features outside of 1km from Sheets are removed later, so they are never decoded
+                layer.SetSpatialFilter(sheets_envelope)
+                enc_layers.append((layer.GetName(), self.get_layer_geometry_types(layer), self.get_layer_records(layer)))
+        for layer_name, layer_types, layer_records in enc_layers:
+            # Primitive layers hold the QUAPOS vector records, all other layers hold feature records
+            primitive_layer = layer_name in self.s57_primitive_layers
+            layer_rules = None
+            if not primitive_layer:
+                layer_rules = self.get_layer_rules(layer_name)
+                if not layer_types:
+                    continue
+                # Skip layers that are unapproved for every geometry type they can hold
+                if layer_rules and all(layer_rules[geom_type] is True for geom_type in layer_types):
+                    continue
+            if primitive_layer:
+                layer_records = [record for record in layer_records if record['properties'].get('QUAPOS') is not None]
+            else:
+                layer_records = [record for record in layer_records if not self.layer_record_unapproved(layer_name, layer_rules, record)]
+            # One vectorized supersession test for the whole layer instead of one call per feature
+            if check_supersession:
+                superseded = self.features_covered_by_upper_scale([record['geometry'] for record in layer_records], int(enc_scale))
+            else:
+                superseded = [False] * len(layer_records)
+            for record, covered in zip(layer_records, superseded):
+                geom_type = record['type']
+                if primitive_layer:
+                    if covered:
+                        records['vectors_intersected'] += 1
+                        continue
+                    record['properties']['SCALE_LVL'] = enc_scale
+                    if geom_type in ['Point', 'LineString', 'Polygon']:
+                        record['scale'] = enc_scale
+                        records['QUAPOS'][geom_type].append(record)
+                    continue
+
+                if covered:
+                    records['intersected'] += 1
+                    continue
+
+                record['properties']['SCALE_LVL'] = enc_scale
+                record = self.set_none_to_null(record)
+                record['properties'] = self.convert_illegal_chars(record['properties'])
+                record['scale'] = enc_scale
+                records['features'][geom_type].append(record)
+        return records
+
+    def run_geometry_pipelines(self) -> None:
+        """
+        Filter, attribute and write each geometry type in its own worker process
+        - Point, LineString and Polygon layers don't interact until they are written to the geodatabase
+        - Each worker writes to its own geodatabase, which is copied into the output geodatabase and removed
+        """
 
-        for geom_type in self.geometries:
-            unassigned_deleted = 0
-            arcpy.AddMessage(f'Removing {geom_type} unassigned outside of 1km')
-            feature_records = self.geometries[geom_type]['features_layers']['unassigned']
-            feature_count = arcpy.management.GetCount(feature_records)
-            # arcpy.management.CopyFeatures(feature_records, os.path.join(output_folder, f'{geom_type}_unassigned_copy.shp')) # Output full unassigned dataset
-            with arcpy.da.UpdateCursor(feature_records, ["SHAPE@"]) as feature_cursor:
-                for row in feature_cursor:
-                    inside = False
-                    for buffer_row in buffer_cursor:
-                        disjointed = row[0].disjoint(buffer_row[0])
-                        if not disjointed:
-                            inside = True
-                            break
-                    if not inside:
-                        unassigned_deleted += 1
-                        feature_cursor.deleteRow()
-            arcpy.AddMessage(f' - Deleted {unassigned_deleted} of {feature_count} unassigned {geom_type} features')
-        del buffer_cursor
+        arcpy.AddMessage(f' - Processing {", ".join(self.geometries)} records in parallel')
+        if sys.platform == 'win32':
+            multiprocessing.set_executable(os.path.join(sys.exec_prefix, 'pythonw.exe'))
+        output_folder = str(self.param_lookup['output_folder'].valueAsText)
+        layerfile_export = bool(self.param_lookup['layerfile_export'].value)
+        pipeline_inputs = [(geom_type, self.geometries[geom_type]['features'], self.geometries[geom_type]['QUAPOS'], 
+                            self.prepared_sheets, output_folder, layerfile_export) for geom_type in self.geometries]
+        with multiprocessing.Pool(processes=len(pipeline_inputs)) as pool:
+            pipeline_outputs = pool.map(run_geometry_pipeline, pipeline_inputs)
+
+        arcpy.AddMessage(' - Merging geometry types to the output geodatabase')
+        for geom_type, (worker_gdb, outputs) in zip(self.geometries, pipeline_outputs):
+            self.merge_geometry_outputs(geom_type, worker_gdb, outputs)
 
     def run_query(self, cursor, sql):
         """
@@ -703,6 +935,24 @@ class ENCReaderEngine(Engine):
         cursor.execute(sql)
         return cursor.fetchall()
 
+    def select_sheets_features(self, layer):
+        """
+        Select the features of a layer that intersect the Sheets
+        - Uses the indexed Sheets polygons instead of a spatial selection against the Sheets layer
+        :param arcpy.FeatureLayer|str layer: Layer or feature class to select from
+        :returns arcpy.FeatureLayer: Layer with the features that intersect the Sheets selected
+        """
+
+        if self.sheets_coverage is None:
+            self.set_sheets_envelope()
+        with arcpy.da.SearchCursor(layer, ['OID@', 'SHAPE@WKB'], spatial_reference=arcpy.SpatialReference(4326)) as cursor:
+            rows = [row for row in cursor]
+        intersected = self.sheets_coverage.intersects_all([row[1] for row in rows])
+        object_ids = [str(row[0]) for row, intersects in zip(rows, intersected) if intersects]
+        oid_field = arcpy.Describe(layer).OIDFieldName
+        where_clause = f'{oid_field} IN ({",".join(object_ids)})' if object_ids else '1 = 0'
+        return arcpy.management.SelectLayerByAttribute(layer, 'NEW_SELECTION', where_clause)
+
     def set_assigned_invreq(self, feature_type, objl_lookup, invreq_options) -> None:
         """
         THIS IS NOT USED ANYMORE
@@ -776,6 +1026,22 @@ class ENCReaderEngine(Engine):
         with open(str(INPUTS / 'lookups' / 'unapproved_features.yaml'), 'r') as lookup:
             self.feature_lookup = yaml.safe_load(lookup)
 
+    def set_sheets_envelope(self) -> None:
+        """
+        Store the WGS84 envelopes of the Sheets buffered by 1km as WKB for filtering ENC files while reading
+        - Also keeps the indexed Sheets and buffered Sheets polygons for assigning records as they are written
+        - Uses the Sheets prepared by CompositeSourceCreatorEngine.convert_sheets() when they are passed in
+        """
+
+        if not self.sheets_layer and self.prepared_sheets is None:
+            return
+
+        if self.prepared_sheets is None:
+            self.prepared_sheets = self.prepare_sheets(self.sheets_layer)
+        self.sheets_envelope = self.prepared_sheets.envelope
+        self.sheets_coverage = self.prepared_sheets.coverage
+        self.sheets_buffer_coverage = self.prepared_sheets.buffer_coverage
+
     def set_unassigned_invreq(self, feature_type, objl_lookup, invreq_options) -> None:
         """
         Isolate logic for setting unassigned layer 'invreq' column
@@ -795,6 +1061,54 @@ class ENCReaderEngine(Engine):
                         row[1] = invreq_options.get(14)
                     updateCursor.updateRow(row)
 
+    def stream_enc_records(self) -> None:
+        """
+        Read each ENC file and write its records straight to the memory layers
+        - Only the records of one batch of `processes` ENC files are held in memory at once
+        """
+
+        arcpy.AddMessage(' - Streaming Feature and QUAPOS records')
+        # Fields are added to the record layers by get_record_writer() as the records are read
+        record_layers = {feature_type: self.create_record_layers(feature_type, {geom_type: [] for geom_type in self.geometries}) 
+                         for feature_type in ['features', 'QUAPOS']}
+        writers = {}
+        intersected = 0
+        vectors_intersected = 0
+        pruned = 0
+        large_lndare = 0
+        outside = {geom_type: 0 for geom_type in self.geometries}
+        cell_coverages = {'covered': 0, 'clear': 0, 'partial': 0}
+        try:
+            for records in self.get_cell_records(batch_size=self.processes):
+                for feature_type in record_layers:
+                    for geom_type, assignment_layers in record_layers[feature_type].items():
+                        layer_records = records[feature_type][geom_type]
+                        if not layer_records:
+                            continue
+                        writer = self.get_record_writer(writers.get((feature_type, geom_type)), assignment_layers, geom_type, layer_records)
+                        writers[(feature_type, geom_type)] = writer
+                        # Unassigned features outside of 1km from Sheets are removed before they are written
+                        skipped_lndare, skipped_outside = self.insert_records(writer['cursors'], writer['build_row'], geom_type, layer_records, 
+                                                                              remove_outside=feature_type == 'features')
+                        large_lndare += skipped_lndare
+                        outside[geom_type] += skipped_outside
+                intersected += records['intersected']
+                vectors_intersected += records['vectors_intersected']
+                pruned += records['pruned']
+                if records['cell_coverage']:
+                    cell_coverages[records['cell_coverage']] += 1
+        finally:
+            # Release every cursor lock before the layers are classified
+            for writer in writers.values():
+                writer['cursor_stack'].close()
+        arcpy.AddMessage(f'  - Skipped {pruned} ENC files outside of 1km from Sheets')
+        self.print_cell_coverages(cell_coverages)
+        arcpy.AddMessage(f'  - Removed {intersected} supersession features')
+        arcpy.AddMessage(f'  - Removed {vectors_intersected} supersession QUAPOS features')
+        arcpy.AddMessage( f' - Removed {large_lndare} LNDARE features with area > 3775m')
+        for geom_type, outside_count in outside.items():
+            arcpy.AddMessage(f' - Removed {outside_count} unassigned {geom_type} features outside of 1km')
+
     def store_gc_names(self, gc_rows) -> None:
         """Create property of all current GC names"""
 
@@ -809,6 +1123,8 @@ class ENCReaderEngine(Engine):
                 self.gc_files.add(gc_name)
     
     def start(self) -> None:
+        # GC features are selected with the prepared Sheets
+        self.set_sheets_envelope()
         if self.param_lookup['download_geographic_cells'].value:
             try:
                 rows = self.get_gc_data()
@@ -819,19 +1135,24 @@ class ENCReaderEngine(Engine):
             except pyodbc.OperationalError as e:
                 arcpy.AddMessage(f' - Unable to download GC files.  Check VPN connection. \n - Error: {e}')
                 pass
-        self.set_driver()
-        self.split_multipoint_env()
         self.get_scale_bounds('ENCReaderEngine')
         self.set_feature_lookup()
-        self.get_feature_records()
-        self.return_primitives_env()
-        self.get_vector_records()
-        self.perform_spatial_filter()
-        self.print_feature_total()
-        self.add_columns()
-        self.convert_noaa_attributes()
-        self.remove_unassigned_buffer()
-        self.export_enc_layers()
+        if self.stream_records:
+            self.stream_enc_records()
+        else:
+            self.get_enc_records()
+        if self.geometry_processes and not self.stream_records:
+            # Streamed records are already in this process's memory layers
+            self.run_geometry_pipelines()
+            self.print_feature_total()
+            self.export_enc_layers(('GC',))
+        else:
+            if not self.stream_records:
+                self.perform_spatial_filter()
+            self.print_feature_total()
+            self.add_columns()
+            self.convert_noaa_attributes()
+            self.export_enc_layers()
         self.join_quapos_to_features()
         
 
@@ -840,6 +1161,7 @@ class ENCReaderEngine(Engine):
         # merge_gc_features - 12.
         # get_feature_records - 115.
         # get_vector_records - 159.
+        # get_enc_records - single pass replaces both
         # perform_spatial_filter - 668. 656 651 176
         # add_columns - 8.
         # join_quapos_to_features - 12.
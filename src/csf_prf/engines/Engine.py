@@ -1,11 +1,15 @@
-import json
 import yaml
+import csv
 import pathlib
 import os
+import struct
 import zipfile
 import arcpy
 
-from osgeo import ogr
+from osgeo import gdal, ogr
+from csf_prf.helpers.coverage import ScaleCoverage
+from csf_prf.helpers.enc_cache import ENCCache
+from csf_prf.helpers.sheets import PreparedSheets
 
 INPUTS = pathlib.Path(__file__).parents[3] / 'inputs'
 CSF_PRF = pathlib.Path(__file__).parents[1]
@@ -19,6 +23,23 @@ class EngineException(Exception):
 
 class Engine:
     max_field_length = 300
+    # Output field type and length by S57 attribute, loaded once from the bundled catalogs
+    attribute_catalog = None
+    # Per-dataset S57 driver open options.  'records' returns features and QUAPOS primitives in one pass
+    # UPDATES=APPLY applies the .001, .002... update files next to a .000 file while reading
+    s57_open_options = {
+        'features': ['UPDATES=APPLY', 'SPLIT_MULTIPOINT=ON', 'LIST_AS_STRING=ON', 'PRESERVE_EMPTY_NUMBERS=ON', 'ADD_SOUNDG_DEPTH=ON'],
+        'primitives': ['UPDATES=APPLY', 'RETURN_PRIMITIVES=ON', 'LIST_AS_STRING=ON', 'PRESERVE_EMPTY_NUMBERS=ON'],
+        'records': ['UPDATES=APPLY', 'SPLIT_MULTIPOINT=ON', 'RETURN_PRIMITIVES=ON', 'LIST_AS_STRING=ON', 'PRESERVE_EMPTY_NUMBERS=ON', 'ADD_SOUNDG_DEPTH=ON']
+    }
+    s57_primitive_layers = ['IsolatedNode', 'ConnectedNode', 'Edge', 'Face']
+    geometry_names = {'POINT': 'Point', 'LINESTRING': 'LineString', 'POLYGON': 'Polygon'}
+    # Folder of parsed ENC files kept between runs, such as pathlib.Path.home() / '.csf_prf' / 'enc_cache'
+    # Off by default because a cached run reads whole ENC files in the main process instead of the
+    # filtered and parallel readers.  Only turn it on when the same ENC files are read many times
+    enc_cache_folder = None
+    # Least recently used parsed ENC files are removed above this size in bytes
+    enc_cache_size = 2 * 1024 ** 3
 
     def add_column_and_constant(self, layer, column, expression='""', field_alias='', field_type='TEXT', field_length=300, code_block='', nullable=False) -> None:
         """
@@ -102,6 +123,88 @@ class Engine:
     #                 for data in unique_subtype_lookup[geometry_type].values():
     #                     arcpy.management.AddSubtype(featureclass, data['code'], data['objl_string'])  
 
+    def build_scale_coverage(self, engine, enc_files) -> dict[str]:
+        """
+        Read the M_COVR records of each ENC file and group the extent polygons by scale
+        :param str engine: ENCReaderEngine uses CATCOV polygons, MHWBufferEngine uses buffered M_COVR extents
+        :param list[str] enc_files: Paths to the ENC files on disk
+        :returns dict[str]: WKB extent polygons by scale, unbuffered WKB MHW extents by scale and the upper scales of each scale
+        """
+
+        scale_polygons = {}
+        scale_extents = {}
+        for enc_path in enc_files:
+            enc_scale = int(pathlib.Path(enc_path).stem[2])  # TODO do we need to look up scale and accept any file name?
+            cell = self.get_enc_cell(enc_path, summary_only=True)
+            if cell:
+                display_scale = cell['metadata']['DSPM_CSCL']
+                m_covr_records = cell['coverage']
+            else:
+                enc_file = self.open_enc_file(enc_path, 'features')
+                metadata_layer = enc_file.GetLayerByName('DSID')
+                metadata = metadata_layer.GetFeature(0)
+                display_scale = metadata.GetField('DSPM_CSCL')
+                m_covr_records = list(self.get_layer_records(enc_file.GetLayerByName('M_COVR')))
+
+            # get CATCOV 1 polygon
+            extent_wkb = None
+            if engine == 'ENCReaderEngine':
+                for record in m_covr_records:
+                    if record['properties']['CATCOV'] == 1:
+                        extent_wkb = bytes(record['geometry'])
+                        break
+            elif engine == 'MHWBufferEngine':
+                envelopes = [ogr.CreateGeometryFromWkb(record['geometry']).GetEnvelope() for record in m_covr_records if record['geometry']]
+                xMin = min(envelope[0] for envelope in envelopes)
+                xMax = max(envelope[1] for envelope in envelopes)
+                yMin = min(envelope[2] for envelope in envelopes)
+                yMax = max(envelope[3] for envelope in envelopes)
+                extent_array = arcpy.Array()
+                extent_array.add(arcpy.Point(xMin, yMin))
+                extent_array.add(arcpy.Point(xMin, yMax))
+                extent_array.add(arcpy.Point(xMax, yMax))
+                extent_array.add(arcpy.Point(xMax, yMin))
+                extent_array.add(arcpy.Point(xMin, yMin))
+                esri_extent_polygon = arcpy.Polygon(extent_array, arcpy.SpatialReference(4326))
+                # Save extent polygons for erasing covered features
+                scale_extents.setdefault(enc_scale, []).append(bytes(esri_extent_polygon.WKB))
+
+                # Esri BUG: Should be able to project any Polygon, but projectAs transformation won't work outside of a cursor
+                memory_extent = arcpy.management.CopyFeatures([esri_extent_polygon], r'memory\enc_extent')
+                with arcpy.da.SearchCursor(memory_extent, ['SHAPE@']) as extent_cursor:
+                    for row in extent_cursor:
+                        projected_geom = row[0].projectAs(arcpy.SpatialReference(5070), 'WGS_1984_(ITRF00)_To_NAD_1983')
+                        chart_scale = int(display_scale) * self.scale_conversion
+                        # buffer ENC extents to match buffered LNDARE, COALNE, SLCONS features that will be erased
+                        esri_extent_polygon = projected_geom.buffer(chart_scale).projectAs(arcpy.SpatialReference(4326), 'WGS_1984_(ITRF00)_To_NAD_1983')
+                        break  # should only be 1 polygon
+                arcpy.management.Delete(memory_extent)
+                extent_wkb = bytes(esri_extent_polygon.WKB)
+
+            if extent_wkb:
+                scale_polygons.setdefault(enc_scale, []).append(extent_wkb)
+
+        # Each scale is superseded by the extent polygons of the scales above it
+        # Ex: Key-2 scale, Values-3,4,5 scales
+        # Ex: Key-3 scale, Values-4,5 scales
+        # Polygons of the upper scales are kept unmerged in a ScaleCoverage STR-tree for supersession
+        scales = sorted(scale_polygons)
+        upper_scales = {}
+        for i, scale in enumerate(scales):
+            if scale + 1 in scales:
+                # if 2 covered by 3
+                upper_scales[scale] = [scale + 1]
+                if scale + 2 in scales: # if there are 2 upper level scales, use both
+                    upper_scales[scale] += scales[i + 2:]
+            else:
+                upper_scales[scale] = []
+
+        return {
+            'scale_polygons': scale_polygons,
+            'scale_extents': scale_extents,
+            'upper_scales': upper_scales
+        }
+
     def convert_illegal_chars(self, feature_dict):
         """
         Convert $ dollar signs to allowed field values
@@ -160,38 +263,46 @@ class Engine:
         except EngineException as e:
             arcpy.AddMessage(f'Error writing {param_name} to {output_path} : \n{e}')            
 
-    def feature_covered_by_upper_scale(self, feature_json, enc_scale):
+    def feature_covered_by_upper_scale(self, geometry, enc_scale):
         """
         Determine if a current Point, LineString, or Polygon intersects an upper scale level ENC extent
-        :param dict[str] feature_json: Loaded JSON of current feature
+        :param bytes geometry: WKB geometry of current feature
         :param int enc_scale: Current ENC file scale level
         :returns boolean: True or False
         """
 
-        if feature_json['geometry'] is None:
+        if geometry is None:
             return False
-        feature_geometry = arcpy.AsShape(json.dumps(feature_json['geometry']))
-        inside = False
 
         # Review Engine.get_scale_bounds() for more information
         # TODO LNDARE needs square extent
         # TODO does supersession need CATCOV or full extent?
-        supersession_polygon = self.scale_bounds[enc_scale]
-        if supersession_polygon and not supersession_polygon.disjoint(feature_geometry):  # not disjoint means intersected
-            inside = True
-        return inside
+        scale_coverage = self.scale_coverages[enc_scale]
+        return bool(scale_coverage) and scale_coverage.intersects(geometry)
+
+    def features_covered_by_upper_scale(self, geometries, enc_scale):
+        """
+        Determine which features of a layer intersect an upper scale level ENC extent in a single call
+        :param list[bytes] geometries: WKB geometries of the layer features
+        :param int enc_scale: Current ENC file scale level
+        :returns list[bool]|np.ndarray: True for each superseded feature
+        """
+
+        scale_coverage = self.scale_coverages[enc_scale]
+        if not scale_coverage:
+            return [False] * len(geometries)
+        return scale_coverage.intersects_all(geometries)
         
     def get_all_fields(self, features) -> None:
         """
         Build a unique list of all field names
-        :param dict[dict[str]] features: GeoJSON of string values for all features
+        :param dict[dict[str]] features: Feature records for all features
         :returns set[str]: Unique list of all fields
         """
 
         fields = set()
         for feature in features:
-            json_fields = feature['geojson']['properties'].keys() if 'geojson' in feature else feature['properties'].keys()
-            for field in json_fields:
+            for field in feature['properties'].keys():
                 if "$" in field:
                     print('field:', field)
                     field = field.replace('$', 'B_')
@@ -204,6 +315,41 @@ class Engine:
         input_enc_files = self.param_lookup['enc_files'].valueAsText.replace("'", "").split(';')
         return [enc for enc in input_enc_files if pathlib.Path(enc).stem[2] != '1']
 
+    def get_attribute_catalog(self) -> dict[str]:
+        """
+        Build the output field type and length of each S57 attribute from s57attributes.csv and s57expectedinput.csv
+        - Integer and float attributes become LONG and DOUBLE fields
+        - Enumerated and list attributes stay TEXT so convert_noaa_attributes() can write their meanings
+        :returns dict[str]: Field type and length by attribute acronym with $ replaced by B_
+        """
+
+        if self.attribute_catalog is not None:
+            return self.attribute_catalog
+
+        meanings = {}
+        with open(str(INPUTS / 'lookups' / 's57expectedinput.csv'), 'r', newline='') as expected_input:
+            for code, _, meaning in list(csv.reader(expected_input))[1:]:
+                meanings.setdefault(code, []).append(meaning)
+
+        attribute_catalog = {}
+        with open(str(INPUTS / 'lookups' / 's57attributes.csv'), 'r', newline='') as attributes:
+            for row in list(csv.reader(attributes))[1:]:
+                code, acronym, attribute_type = row[0], row[2], row[3]
+                field_name = acronym.replace('$', 'B_')
+                if attribute_type == 'I':
+                    attribute_catalog[field_name] = ('LONG', None)
+                elif attribute_type == 'F':
+                    attribute_catalog[field_name] = ('DOUBLE', None)
+                elif attribute_type == 'E' and code in meanings:
+                    # Invalid codes such as 2147483641 are kept as they are
+                    attribute_catalog[field_name] = ('TEXT', max([10] + [len(meaning) for meaning in meanings[code]]))
+                elif attribute_type == 'L' and code in meanings:
+                    # Every meaning joined with commas
+                    list_length = sum(len(meaning) + 1 for meaning in meanings[code])
+                    attribute_catalog[field_name] = ('TEXT', min(max(list_length, 10), self.max_field_length))
+        Engine.attribute_catalog = attribute_catalog
+        return attribute_catalog
+
     def get_aton_lookup(self):
         """
         Return ATON values that are not allowed in CSF
@@ -213,6 +359,25 @@ class Engine:
         with open(str(INPUTS / 'lookups' / 'aton_lookup.yaml'), 'r') as lookup:
             return yaml.safe_load(lookup)       
 
+    def get_cell_coverage(self, coverage_records, enc_scale) -> str:
+        """
+        Compare the M_COVR coverage of an ENC file against the upper scale coverage once
+        - Features of covered ENC files are all superseded and features of clear ENC files never are
+        - Only partial ENC files need the per feature supersession check
+        :param list[dict] coverage_records: M_COVR records of the ENC file
+        :param int enc_scale: Current ENC file scale level
+        :returns str: covered, clear or partial
+        """
+
+        scale_coverage = self.scale_coverages[enc_scale]
+        if not scale_coverage:
+            return 'clear'
+        coverage_polygons = [record['geometry'] for record in coverage_records 
+                             if record['properties'].get('CATCOV') == 1 and record['geometry']]
+        if not coverage_polygons:
+            return 'partial'
+        return scale_coverage.classify(coverage_polygons)
+
     def get_config_item(self, parent: str, child: str=False) -> tuple[str, int]:
         """Load config and return speciific key"""
 
@@ -224,15 +389,135 @@ class Engine:
             else:
                 return parent_item
 
+    def get_enc_cell(self, enc_path, summary_only=False) -> dict:
+        """
+        Obtain a parsed ENC file from the ENC cache, reading and caching the file when it changed
+        :param str enc_path: Path to an ENC file on disk
+        :param bool summary_only: Only load metadata and M_COVR records
+        :returns dict[str]|None: Parsed ENC file, None when the ENC cache is turned off
+        """
+
+        if not self.enc_cache_folder:
+            return None
+        enc_cache = ENCCache(self.enc_cache_folder, self.enc_cache_size)
+        # Hashing reads the whole ENC file, so each key is only built once per run
+        key = self.enc_cache_keys.get(enc_path)
+        if key is None:
+            key = enc_cache.get_key(enc_path, self.get_enc_update_files(enc_path))
+            self.enc_cache_keys[enc_path] = key
+        cell = enc_cache.load(key, summary_only)
+        if cell is None:
+            # Only new ENC files or ENC files with a new edition or update are read
+            arcpy.AddMessage(f' - Caching ENC file: {key}')
+            cell = self.parse_enc_file(enc_path)
+            enc_cache.store(key, cell)
+        return cell
+
     def get_enc_display_scale(self, enc_file) -> str:
         """Obtain ENC resolution scale for setting buffer value"""
 
         metadata_layer = enc_file.GetLayerByName('DSID')
         metadata = metadata_layer.GetFeature(0)
-        metadata_json = json.loads(metadata.ExportToJson())
-        display_scale = metadata_json['properties']['DSPM_CSCL']
+        display_scale = metadata.GetField('DSPM_CSCL')
         return display_scale
+
+    def get_enc_update_files(self, enc_path) -> list[str]:
+        """
+        Find the update files GDAL applies to an ENC file
+        :param str enc_path: Path to an ENC .000 file on disk
+        :returns list[str]: Sorted paths of the .001, .002... update files
+        """
+
+        enc_path = pathlib.Path(enc_path)
+        update_files = [update_file for update_file in enc_path.parent.glob(f'{enc_path.stem}.[0-9][0-9][0-9]') 
+                        if update_file.suffix != '.000']
+        return [str(update_file) for update_file in sorted(update_files, key=lambda update_file: int(update_file.suffix[1:]))]
+
+    def get_feature_record(self, feature, field_names) -> dict:
+        """
+        Read attributes by field index and geometry as WKB without serializing the feature to text
+        :param ogr.Feature feature: Current feature from an ENC layer
+        :param list[str] field_names: Field names in layer definition order; see Engine.get_field_names()
+        :returns dict[str]: Feature record with properties, WKB geometry and geometry type
+        """
+
+        properties = {field_name: feature.GetField(index) for index, field_name in enumerate(field_names)}
+        geometry = feature.GetGeometryRef()
+        if geometry is None or geometry.IsEmpty():
+            return {'properties': properties, 'geometry': None, 'type': False}
+        geometry.FlattenTo2D()  # SOUNDG depth is stored in the DEPTH attribute
+        return {
+            'properties': properties,
+            'geometry': bytes(geometry.ExportToWkb(ogr.wkbNDR)),
+            'type': self.geometry_names.get(geometry.GetGeometryName(), False)
+        }
+
+    def get_field_definitions(self, fields, text_length=300) -> list[list]:
+        """
+        Build typed AddFields definitions for the attribute fields of an output layer
+        :param list[str] fields: Sorted field names of the layer
+        :param int text_length: Length of TEXT fields that are not enumerated or list attributes
+        :returns list[list]: Field name, type, alias and length for arcpy.management.AddFields()
+        """
+
+        attribute_catalog = self.get_attribute_catalog()
+        field_definitions = []
+        for field in fields:
+            field_type, field_length = attribute_catalog.get(field, ('TEXT', text_length))
+            field_definitions.append([field, field_type, field, field_length or ''])
+        return field_definitions
+
+    def get_field_names(self, layer) -> list[str]:
+        """
+        Get the field names of a layer once so features can be read by index
+        :param ogr.Layer layer: Current ENC layer
+        :returns list[str]: Field names in layer definition order
+        """
+
+        layer_definition = layer.GetLayerDefn()
+        return [layer_definition.GetFieldDefn(index).GetName() for index in range(layer_definition.GetFieldCount())]
             
+    def get_layer_geometry_types(self, layer) -> list[str]:
+        """
+        Obtain the geometry types an S57 layer can hold
+        - Layers with mixed primitives report an unknown type and can hold any geometry
+        :param ogr.Layer layer: S57 layer
+        :returns list[str]: Geometry type names
+        """
+
+        layer_type = ogr.GT_Flatten(layer.GetGeomType())
+        if layer_type == ogr.wkbNone:
+            return []
+        layer_types = {ogr.wkbPoint: 'Point', ogr.wkbLineString: 'LineString', ogr.wkbPolygon: 'Polygon'}
+        if layer_type in layer_types:
+            return [layer_types[layer_type]]
+        return list(self.geometry_names.values())
+
+    def get_layer_records(self, layer):
+        """
+        Iterate the records of an ENC layer
+        :param ogr.Layer layer: Current ENC layer
+        :returns Generator[dict]: Feature records; see Engine.get_feature_record()
+        """
+
+        layer.ResetReading()
+        field_names = self.get_field_names(layer)
+        for feature in layer:
+            if feature:
+                yield self.get_feature_record(feature, field_names)
+
+    def get_normalized_records(self, layer):
+        """
+        Iterate the feature records of an ENC layer the same way they are stored in the ENC cache
+        :param ogr.Layer layer: Current ENC feature layer
+        :returns Generator[dict]: Feature records normalized with set_none_to_null and convert_illegal_chars
+        """
+
+        for record in self.get_layer_records(layer):
+            record = self.set_none_to_null(record)
+            record['properties'] = self.convert_illegal_chars(record['properties'])
+            yield record
+
     def get_multiple_values_from_field(self, field_name, current_value, s57_lookup):
         """
         Isolating logic for handling multiple values being found in one S57 field
@@ -259,90 +544,95 @@ class Engine:
         multiple_value_result = ','.join(new_values)
         return multiple_value_result  
 
-    def get_scale_bounds(self, engine) -> None:
-        """Create lookup for ENC extents by scale"""
+    def get_text_lengths(self, layer) -> dict[str]:
+        """
+        Obtain the length of each text field of a layer
+        :param arcpy.FeatureLayer|str layer: Layer or feature class
+        :returns dict[str]: Field length by text field name
+        """
 
-        scale_polygons = {}
-        enc_files = self.get_approved_enc_files()
-        for enc_path in enc_files:
-            enc_file = self.open_file(enc_path)
-            enc_scale = int(pathlib.Path(enc_path).stem[2])  # TODO do we need to look up scale and accept any file name?
-            metadata_layer = enc_file.GetLayerByName('DSID')
-            metadata = metadata_layer.GetFeature(0)
-            metadata_json = json.loads(metadata.ExportToJson())
-            # resolution = metadata_json['properties']['DSPM_CSCL']
-            scale_level = metadata_json['properties']['DSID_INTU']
+        return {field.name: field.length for field in arcpy.ListFields(layer) if field.type == 'String'}
 
-            extents_folder = pathlib.Path(self.param_lookup['output_folder'].valueAsText) / 'enc_extents'
-            extents_folder.mkdir(parents=True, exist_ok=True) 
-            output_extent_polygon = extents_folder / f'extent_{pathlib.Path(enc_path).stem}.shp'
+    def get_point_xy(self, geometry) -> tuple[float, float]:
+        """
+        Read the XY of a little endian WKB Point for a SHAPE@XY cursor token
+        :param bytes geometry: WKB Point geometry
+        :returns (float, float): XY coordinates
+        """
 
-            # get CATCOV 1 polygon
-            m_covr_layer = enc_file.GetLayerByName('M_COVR')
-            if engine == 'ENCReaderEngine':
-                for feature in m_covr_layer:
-                    feature_json = json.loads(feature.ExportToJson())
-                    if feature_json['properties']['CATCOV'] == 1:
-                        points = [arcpy.Point(*coords) for polygon in feature_json['geometry']['coordinates'] for coords in polygon]
-                        esri_extent_polygon = arcpy.Polygon(arcpy.Array(points))
-                        break
-                # Save extent polygons for LNDARE clipping
-                arcpy.management.CopyFeatures([esri_extent_polygon], str(output_extent_polygon))
-                arcpy.management.DefineProjection(str(output_extent_polygon), 4326)
-            elif engine == 'MHWBufferEngine':
-                xMin, xMax, yMin, yMax = m_covr_layer.GetExtent()
-                extent_array = arcpy.Array()
-                extent_array.add(arcpy.Point(xMin, yMin))
-                extent_array.add(arcpy.Point(xMin, yMax))
-                extent_array.add(arcpy.Point(xMax, yMax))
-                extent_array.add(arcpy.Point(xMax, yMin))
-                extent_array.add(arcpy.Point(xMin, yMin))
-                esri_extent_polygon = arcpy.Polygon(extent_array)
-                
-                # Save extent polygons for LNDARE clipping
-                arcpy.management.CopyFeatures([esri_extent_polygon], str(output_extent_polygon))
-                arcpy.management.DefineProjection(str(output_extent_polygon), 4326)
-                # Esri BUG: Should be able to project any Polygon, but projectAs transformation won't work outside of a cursor
-                display_scale = self.get_enc_display_scale(enc_file)
-                with arcpy.da.UpdateCursor(str(output_extent_polygon), ['SHAPE@']) as extent_cursor:
-                    for row in extent_cursor:
-                        projected_geom = row[0].projectAs(arcpy.SpatialReference(5070), 'WGS_1984_(ITRF00)_To_NAD_1983')
-                        chart_scale = int(display_scale) * self.scale_conversion
-                        # buffer ENC extents to match buffered LNDARE, COALNE, SLCONS features that will be erased
-                        esri_extent_polygon = projected_geom.buffer(chart_scale).projectAs(arcpy.SpatialReference(4326), 'WGS_1984_(ITRF00)_To_NAD_1983')
-                        break  # should only be 1 polygon
+        # 1 byte order + 4 byte geometry type precede the coordinates
+        return struct.unpack_from('<dd', geometry, 5)
 
-            if scale_level not in scale_polygons:
-                scale_polygons[enc_scale] = []
-            scale_polygons[enc_scale].append(esri_extent_polygon)
-
-        # Make a single multi-part extent polygon for each scale
-        union_polygons = {}
-        for scale, polygons in scale_polygons.items():
-            polygon = polygons[0]
-            if len(polygons) > 1:
-                for add_polygon in polygons[1:]:
-                    polygon = polygon.union(add_polygon)
-            union_polygons[scale] = polygon
-        
-        # Merge upper level extent polygons
-        # Each scale_bounds value is a union of all upper level extent polygons
-        # Ex: Key-2 scale, Values-union of 3,4,5 catcov polygons
-        # Ex: Key-3 scale, Values-union of 4,5 catcov polygons
-        scales = sorted(union_polygons) 
-        # [2, 3, 4, 5]
-        for i, scale in enumerate(scales):
-            # 0, 2
-            if scale + 1 in scales:
-                # if 2 covered by 3
-                supersession_polygon = union_polygons[scale + 1]
-                if scale + 2 in scales: # if there are 2 upper level scales, merge them
-                    upper_scales = scales[i + 2:]
-                    for upper_scale in upper_scales:
-                        supersession_polygon = supersession_polygon.union(union_polygons[upper_scale])
-                self.scale_bounds[scale] = supersession_polygon
+    def get_row_writer(self, cursor_fields):
+        """
+        Compile an InsertCursor row builder once per layer
+        - Field positions are mapped once instead of searching the cursor fields for every attribute of every feature
+        - LONG and DOUBLE attributes from Engine.get_attribute_catalog() are written as numbers
+        - Enumerated and list attribute text is cut to its catalog field length
+        :param list[str] cursor_fields: Geometry token followed by the field names of the layer
+        :returns function: Builds an insert row from a geometry and a properties dictionary
+        """
+
+        field_slots = {field: index for index, field in enumerate(cursor_fields)}
+        attribute_catalog = self.get_attribute_catalog()
+        numeric_types = {'LONG': lambda value: int(float(value)), 'DOUBLE': float}
+        field_types = [attribute_catalog.get(field, ('TEXT', None)) for field in cursor_fields]
+        converters = [numeric_types.get(field_type, str) for field_type, _ in field_types]
+        # None keeps the whole string for fields that aren't sized from the catalog
+        text_lengths = [field_length if field_type == 'TEXT' else None for field_type, field_length in field_types]
+        # Unset text attributes are empty strings.  Using None would leave some different
+        # Unset numeric attributes are null
+        row_template = ['' if converter is str else None for converter in converters]
+
+        def build_row(geometry, properties):
+            row = row_template.copy()
+            row[0] = geometry
+            for fieldname, attr in properties.items():
+                slot = field_slots[fieldname]
+                converter = converters[slot]
+                if converter is str:
+                    row[slot] = str(attr)[:text_lengths[slot]]
+                elif attr not in ['', None]:
+                    try:
+                        row[slot] = converter(attr)
+                    except ValueError:
+                        # Leave values that are not numbers null instead of failing the insert
+                        pass
+            return row
+        return build_row
+
+    def get_scale_bounds(self, engine) -> None:
+        """
+        Create lookup for ENC extents by scale
+        - Scale coverages are loaded from the ENC cache when the same ENC file editions were used before
+        :param str engine: ENCReaderEngine uses CATCOV polygons, MHWBufferEngine uses buffered M_COVR extents
+        """
+
+        enc_files = self.get_approved_enc_files()
+        coverage = None
+        if self.enc_cache_folder:
+            enc_cache = ENCCache(self.enc_cache_folder, self.enc_cache_size)
+            editions = [enc_cache.get_edition(enc_path, self.get_enc_update_files(enc_path)) for enc_path in enc_files]
+            settings = [engine, str(self.scale_conversion)] if engine == 'MHWBufferEngine' else [engine]
+            key = enc_cache.get_coverage_key(settings, editions)
+            coverage = enc_cache.load_coverage(key)
+            if coverage is not None:
+                arcpy.AddMessage(f' - Loaded scale coverages: {key}')
+        if coverage is None:
+            coverage = self.build_scale_coverage(engine, enc_files)
+            if self.enc_cache_folder:
+                enc_cache.store_coverage(key, coverage)
+
+        spatial_reference = arcpy.SpatialReference(4326)
+        for scale, upper_scales in coverage['upper_scales'].items():
+            if upper_scales:
+                self.scale_coverages[scale] = ScaleCoverage([polygon for upper_scale in upper_scales 
+                                                             for polygon in coverage['scale_polygons'][upper_scale]])
             else:
-                self.scale_bounds[scale] = False
+                self.scale_coverages[scale] = False
+        # Unbuffered M_COVR extents used to erase covered MHW features
+        self.scale_extents = {scale: [arcpy.FromWKB(polygon, spatial_reference) for polygon in polygons] 
+                              for scale, polygons in coverage['scale_extents'].items()}
 
     def get_unique_subtype_codes(self, subtype_lookup):
         """
@@ -383,20 +673,77 @@ class Engine:
         csf_prf_toolbox = str(CSF_PRF / 'CSF_PRF_Toolbox.pyt')
         arcpy.ImportToolbox(csf_prf_toolbox)
 
-    def open_file(self, enc_path):
+    def open_enc_file(self, enc_path, options_name):
         """
-        Open a single input ENC file
+        Open a single input ENC file with S57 options set on the dataset instead of the environment
         :param str enc_path: Path to an ENC file on disk
-        :returns GDAL.File: GDAL File object you can loop through
+        :param str options_name: Key for Engine.s57_open_options
+        :returns gdal.Dataset: GDAL Dataset object with S57 layers
         """
 
-        enc_file = self.driver.Open(enc_path, 0)
-        return enc_file 
+        gdal.SetConfigOption('S57_CSV', str(INPUTS / 'lookups'))
+        enc_file = gdal.OpenEx(enc_path, gdal.OF_VECTOR | gdal.OF_READONLY, allowed_drivers=['S57'], 
+                               open_options=self.s57_open_options[options_name])
+        return enc_file
 
-    def return_primitives_env(self) -> None:
-        """Reset S57 ENV for primitives only"""
+    def parse_enc_file(self, enc_path) -> dict:
+        """
+        Read every layer of an ENC file into records for the ENC cache
+        - Feature records are normalized with set_none_to_null and convert_illegal_chars
+        - Primitive records are only kept when they have QUAPOS
+        :param str enc_path: Path to an ENC file on disk
+        :returns dict[str]: DSID metadata, M_COVR records and the records of each layer
+        """
+
+        enc_file = self.open_enc_file(enc_path, 'records')
+        metadata = enc_file.GetLayerByName('DSID').GetFeature(0)
+        cell = {
+            'metadata': {'DSID_INTU': metadata.GetField('DSID_INTU'), 'DSPM_CSCL': metadata.GetField('DSPM_CSCL')},
+            'coverage': [],
+            'layers': []
+        }
+        for layer_index in range(enc_file.GetLayerCount()):
+            layer = enc_file.GetLayer(layer_index)
+            geometry_types = self.get_layer_geometry_types(layer)
+            if not geometry_types:
+                continue
+            primitive_layer = layer.GetName() in self.s57_primitive_layers
+            records = []
+            for record in self.get_layer_records(layer) if primitive_layer else self.get_normalized_records(layer):
+                if record['type'] not in ['Point', 'LineString', 'Polygon']:
+                    continue
+                if primitive_layer and record['properties'].get('QUAPOS') is None:
+                    continue
+                records.append(record)
+            if layer.GetName() == 'M_COVR':
+                cell['coverage'] = records
+            cell['layers'].append({'name': layer.GetName(), 'geometry_types': geometry_types, 'records': records})
+        return cell
+
+    def prepare_sheets(self, sheets_layer) -> PreparedSheets:
+        """
+        Load the Sheets polygons and their 1km buffer once for every step that tests features against the Sheets
+        :param arcpy.FeatureLayer|str sheets_layer: Sheets layer or path to a Sheets feature class
+        :returns PreparedSheets: Repaired, subdivided and indexed Sheets polygons
+        """
+
+        with arcpy.da.SearchCursor(sheets_layer, ['SHAPE@WKB'], spatial_reference=arcpy.SpatialReference(4326)) as cursor:
+            sheets_wkb = [row[0] for row in cursor if row[0]]
+        sheets_buffer = arcpy.analysis.Buffer(sheets_layer, 'memory/sheets_buffer', '1 kilometers')
+        with arcpy.da.SearchCursor(sheets_buffer, ['SHAPE@WKB'], spatial_reference=arcpy.SpatialReference(4326)) as cursor:
+            buffer_wkb = [row[0] for row in cursor if row[0]]
+        arcpy.management.Delete(sheets_buffer)
+        return PreparedSheets(sheets_wkb, buffer_wkb)
+
+    def print_cell_coverages(self, cell_coverages) -> None:
+        """
+        Print how many ENC files needed the per feature supersession check
+        :param dict[str] cell_coverages: Count of ENC files by covered, clear or partial
+        """
 
-        os.environ["OGR_S57_OPTIONS"] = "RETURN_PRIMITIVES=ON,LIST_AS_STRING=ON,PRESERVE_EMPTY_NUMBERS=ON"            
+        arcpy.AddMessage(f'  - Superseded {cell_coverages["covered"]} ENC files fully covered by upper scale ENC files')
+        arcpy.AddMessage(f'  - Skipped supersession for {cell_coverages["clear"]} ENC files clear of upper scale ENC files')
+        arcpy.AddMessage(f'  - Checked supersession per feature for {cell_coverages["partial"]} ENC files')
 
     def reverse(self, geom_list):
         """
@@ -409,11 +756,6 @@ class Engine:
 
         return list(reversed(geom_list))
 
-    def set_driver(self) -> None:
-        """Set the S57 driver for GDAL"""
-
-        self.driver = ogr.GetDriverByName('S57')
-
     def set_enc_files_param(self, output_folder: pathlib.Path) -> None:
         """Set the ENC files parameter after downloading files"""
         
@@ -431,8 +773,8 @@ class Engine:
     def set_none_to_null(self, feature_json):
         """
         Convert undesirable text to empty string
-        :param dict[dict[]] feature_json: JSON object of ENC Vector features
-        :returns dict[dict[]]: Updated JSON object
+        :param dict[dict[]] feature_json: Feature record of ENC Vector features
+        :returns dict[dict[]]: Updated feature record
         """
 
         for key, value in feature_json['properties'].items():
@@ -505,11 +847,18 @@ class Engine:
 
         return outer_features, inner_features
 
-    def split_multipoint_env(self) -> None:
-        """Reset S57 ENV for split multipoint only"""
+    def truncate_text(self, value, field_length):
+        """
+        Cut a converted text value to the length of its field
+        - Meanings of enumerated fields and unconverted NOAA strings can be longer than the field
+        :param str value: Converted field value
+        :param int field_length: Length of the text field, None to keep the whole value
+        :returns str: Value that fits in the field
+        """
 
-        os.environ["S57_CSV"] = str(INPUTS / 'lookups')
-        os.environ["OGR_S57_OPTIONS"] = "SPLIT_MULTIPOINT=ON,LIST_AS_STRING=ON,PRESERVE_EMPTY_NUMBERS=ON,ADD_SOUNDG_DEPTH=ON"    
+        if isinstance(value, str) and field_length:
+            return value[:field_length]
+        return value
 
     def unzip_enc_files(self, output_folder, file_ending) -> None:
         """Unzip all zip fileis in a folder"""
@@ -2,9 +2,9 @@ import json
 import arcpy
 import pathlib
 import yaml
-import shutil
 
 from csf_prf.engines.Engine import Engine
+from csf_prf.helpers.sheets import PreparedSheets
 
 arcpy.env.overwriteOutput = True
 
@@ -12,11 +12,6 @@ arcpy.env.overwriteOutput = True
 INPUTS = pathlib.Path(__file__).parents[3] / 'inputs'
 
 
-class EncExtentsFolderNotFound(Exception):
-    """Exception for missing ENC Extents folder"""
-    pass
-
-
 class MHWBufferEngine(Engine):
     """Class to download all ENC files that intersect a project boundary shapefile"""
 
@@ -26,7 +21,9 @@ class MHWBufferEngine(Engine):
         self.layers = {'buffered': None, 'dissolved': None, 'merged': None, 
                        'COALNE': None, 'SLCONS': None, 'LNDARE': None}
         self.chartscale_layer = None
-        self.scale_bounds = {}
+        self.scale_coverages = {}
+        self.scale_extents = {}
+        self.enc_cache_keys = {}
         self.intersected = 0
         self.scale_conversion = 0.0008
 
@@ -83,22 +80,16 @@ class MHWBufferEngine(Engine):
 
         all_fields = self.get_all_fields(self.features[feature_type])
         sorted_fields = sorted(all_fields)
-        for field in sorted_fields:
-            arcpy.management.AddField(self.layers[feature_type], field, 'TEXT', field_length=100, field_is_nullable='NULLABLE')
-        arcpy.management.AddField(self.layers[feature_type], 'layer_type', 'TEXT', field_length=10, field_is_nullable='NULLABLE')
+        arcpy.management.AddFields(self.layers[feature_type], self.get_field_definitions(sorted_fields, text_length=100) + [['layer_type', 'TEXT', 'layer_type', 10]])
 
         arcpy.AddMessage(f'Building {feature_type} layer')
-        cursor_fields = ['SHAPE@JSON'] + sorted_fields + ['layer_type']
+        cursor_fields = ['SHAPE@WKB'] + sorted_fields + ['layer_type']
+        build_row = self.get_row_writer(cursor_fields)
         with arcpy.da.InsertCursor(self.layers[feature_type], cursor_fields, explicit=True) as feature_cursor: 
             for feature in self.features[feature_type]:
-                attribute_values = ['' for i in range(len(cursor_fields))]
-                geometry = feature['geometry']
-                attribute_values[0] = arcpy.AsShape(geometry).JSON
-                for fieldname, attr in list(feature['properties'].items()):
-                    field_index = feature_cursor.fields.index(fieldname)
-                    attribute_values[field_index] = str(attr)
-                layer_type_index = feature_cursor.fields.index('layer_type')
-                attribute_values[layer_type_index] = feature_type
+                attribute_values = build_row(feature['geometry'], feature['properties'])
+                # layer_type is the last cursor field
+                attribute_values[-1] = feature_type
                 feature_cursor.insertRow(attribute_values)
 
     def build_line_features(self) -> None:
@@ -118,9 +109,13 @@ class MHWBufferEngine(Engine):
         sheet_parameter = self.param_lookup['sheets'].valueAsText
         # Create output sheets to manipulate
         self.layers['clipped_sheets'] = arcpy.management.CopyFeatures(sheet_parameter, str(pathlib.Path('memory') / 'clipped_sheets'))
-        dissolved_selection = arcpy.management.SelectLayerByLocation(self.layers['dissolved'], 'INTERSECT', self.layers['clipped_sheets'])
-        with arcpy.da.SearchCursor(dissolved_selection, ['SHAPE@']) as dissolved_cursor:
-            dissolved_polygons = [row[0] for row in dissolved_cursor]
+        # Sheets are read once and indexed to find the dissolved polygons that touch them
+        with arcpy.da.SearchCursor(self.layers['clipped_sheets'], ['SHAPE@WKB'], spatial_reference=arcpy.SpatialReference(4326)) as sheet_cursor:
+            prepared_sheets = PreparedSheets([row[0] for row in sheet_cursor if row[0]])
+        with arcpy.da.SearchCursor(self.layers['dissolved'], ['SHAPE@', 'SHAPE@WKB'], spatial_reference=arcpy.SpatialReference(4326)) as dissolved_cursor:
+            dissolved_rows = [row for row in dissolved_cursor]
+        intersected = prepared_sheets.coverage.intersects_all([row[1] for row in dissolved_rows])
+        dissolved_polygons = [row[0] for row, intersects in zip(dissolved_rows, intersected) if intersects]
         with arcpy.da.UpdateCursor(self.layers['clipped_sheets'], ['SHAPE@']) as sheet_cursor:
             for row in sheet_cursor:
                 sheet_geom = row[0]
@@ -129,13 +124,6 @@ class MHWBufferEngine(Engine):
                         sheet_geom = sheet_geom.difference(polygon)
                 sheet_cursor.updateRow([sheet_geom])
 
-    def delete_enc_extents(self) -> None:
-        """Remove the 'enc_extents' folder and shapefiles after tool runs"""
-
-        enc_extents_folder = pathlib.Path(self.param_lookup['output_folder'].valueAsText) / 'enc_extents'
-        if enc_extents_folder.exists():
-            shutil.rmtree(enc_extents_folder)
-
     def dissolve_polygons(self) -> None:
         """Dissolve overlapping polygons to create a single polygon"""
 
@@ -150,19 +138,8 @@ class MHWBufferEngine(Engine):
         """Use buffered upper level extent polygons to erase covered lower level buffered features"""
 
         arcpy.AddMessage(f'Removing lower scale features covered by upper scale charts')
-        output_folder = pathlib.Path(self.param_lookup['output_folder'].valueAsText)
-        enc_extents_folder = output_folder / 'enc_extents'
-        if not enc_extents_folder.exists():
-            raise EncExtentsFolderNotFound(f'Error - Missing {enc_extents_folder} folder')
-        extent_shapefiles = enc_extents_folder.rglob('extent_*.shp')
-        scale_extent_lookup = {}
-        for scale in range(2, 7):
-            scale_extent_lookup[str(scale)] = []
-        for shp in extent_shapefiles:
-            scale = str(shp.stem)[9]
-            if scale == '1':  # TODO should be also skip 2?
-                continue
-            scale_extent_lookup[scale].append(str(shp))
+        # TODO should be also skip 2?
+        scale_extent_lookup = {str(scale): self.scale_extents.get(scale, []) for scale in range(2, 7)}
 
         lndare_start = arcpy.management.GetCount(self.layers['buffered'])
 
@@ -172,7 +149,7 @@ class MHWBufferEngine(Engine):
             scale_level_2_features = arcpy.management.SelectLayerByAttribute(self.layers['buffered'], "NEW_SELECTION", 'enc_scale = ' + "2")
             # Create an in memory layer of all upper level extent polygons
             # TODO does each extent polygon need to be buffered as well to properly overlap buffered LNDARE, COALNE, SLCONS features?
-            arcpy.management.Merge(
+            arcpy.management.CopyFeatures(
                 scale_extent_lookup[str(3)]
                 + scale_extent_lookup[str(4)]
                 + scale_extent_lookup[str(5)]
@@ -189,7 +166,7 @@ class MHWBufferEngine(Engine):
         if scale_extent_lookup[str(4)] or scale_extent_lookup[str(5)] or scale_extent_lookup[str(6)]:
             # Repeat same process for each level 2-4
             scale_level_3_features = arcpy.management.SelectLayerByAttribute(self.layers['buffered'], "NEW_SELECTION", 'enc_scale = ' + "3")
-            arcpy.management.Merge(scale_extent_lookup[str(4)] + scale_extent_lookup[str(5)] + scale_extent_lookup[str(6)], 
+            arcpy.management.CopyFeatures(scale_extent_lookup[str(4)] + scale_extent_lookup[str(5)] + scale_extent_lookup[str(6)], 
                                                             'memory/scale_3_extents')
             erased = arcpy.analysis.PairwiseErase(scale_level_3_features, 'memory/scale_3_extents', 'memory/scale_3_erase')
             arcpy.management.DeleteFeatures(scale_level_3_features)
@@ -197,14 +174,14 @@ class MHWBufferEngine(Engine):
 
         if scale_extent_lookup[str(5)] or scale_extent_lookup[str(6)]:
             scale_level_4_features = arcpy.management.SelectLayerByAttribute(self.layers['buffered'], "NEW_SELECTION", 'enc_scale = ' + "4")
-            arcpy.management.Merge(scale_extent_lookup[str(5)] + scale_extent_lookup[str(6)], 'memory/scale_4_extents')
+            arcpy.management.CopyFeatures(scale_extent_lookup[str(5)] + scale_extent_lookup[str(6)], 'memory/scale_4_extents')
             erased = arcpy.analysis.PairwiseErase(scale_level_4_features, 'memory/scale_4_extents', 'memory/scale_4_erase')
             arcpy.management.DeleteFeatures(scale_level_4_features)
             arcpy.management.Append(erased, self.layers['buffered'])
 
         if scale_extent_lookup[str(6)]:
             scale_level_5_features = arcpy.management.SelectLayerByAttribute(self.layers['buffered'], "NEW_SELECTION", 'enc_scale = ' + "5")
-            arcpy.management.Merge(scale_extent_lookup[str(6)], 'memory/scale_5_extents')
+            arcpy.management.CopyFeatures(scale_extent_lookup[str(6)], 'memory/scale_5_extents')
             erased = arcpy.analysis.PairwiseErase(scale_level_5_features, 'memory/scale_5_extents', 'memory/scale_5_erase')
             arcpy.management.DeleteFeatures(scale_level_5_features)
             arcpy.management.Append(erased, self.layers['buffered'])
@@ -234,19 +211,36 @@ class MHWBufferEngine(Engine):
 
         arcpy.AddMessage('Reading COALNE & SLCONS Feature records')   
         enc_files = self.get_approved_enc_files()
+        cell_coverages = {'covered': 0, 'clear': 0, 'partial': 0}
         for enc_path in enc_files:
-            enc_file = self.open_file(enc_path)
             enc_scale = pathlib.Path(enc_path).stem[2]
-            display_scale = self.get_enc_display_scale(enc_file)
-            for layer in enc_file:
-                layer.ResetReading()
-                name = layer.GetDescription()
-                if name == 'COALNE':
-                    self.store_coalne_features(layer, enc_scale, display_scale)
-                elif name == 'SLCONS':
-                    self.store_slcons_features(layer, enc_scale, display_scale)
+            cell = self.get_enc_cell(enc_path)
+            if cell:
+                display_scale = cell['metadata']['DSPM_CSCL']
+                coverage_records = cell['coverage']
+                enc_layers = [(layer['name'], layer['records']) for layer in cell['layers']]
+            else:
+                # Same open options and record normalization as the cached ENC files
+                enc_file = self.open_enc_file(enc_path, 'records')
+                display_scale = self.get_enc_display_scale(enc_file)
+                coverage_layer = enc_file.GetLayerByName('M_COVR')
+                coverage_records = list(self.get_normalized_records(coverage_layer)) if coverage_layer is not None else []
+                enc_layers = []
+                for layer_index in range(enc_file.GetLayerCount()):
+                    layer = enc_file.GetLayer(layer_index)
+                    enc_layers.append((layer.GetDescription(), self.get_normalized_records(layer)))
+            cell_coverage = self.get_cell_coverage(coverage_records, int(enc_scale))
+            cell_coverages[cell_coverage] += 1
+            check_supersession = cell_coverage == 'partial'
+            for name, records in enc_layers:
+                # LNDARE is never superseded here, covered ENC files only skip COALNE and SLCONS
+                if name == 'COALNE' and cell_coverage != 'covered':
+                    self.store_coalne_features(records, enc_scale, display_scale, check_supersession)
+                elif name == 'SLCONS' and cell_coverage != 'covered':
+                    self.store_slcons_features(records, enc_scale, display_scale, check_supersession)
                 elif name == 'LNDARE':
-                    self.store_lndare_features(layer, enc_scale, display_scale)
+                    self.store_lndare_features(records, enc_scale, display_scale)
+        self.print_cell_coverages(cell_coverages)
         arcpy.AddMessage(f' - Removed {self.intersected} supersession features')
 
     def merge_feature_layers(self) -> None:
@@ -310,8 +304,6 @@ class MHWBufferEngine(Engine):
 
         if not self.param_lookup['enc_files'].valueAsText:
             self.download_enc_files()
-        self.set_driver()
-        self.return_primitives_env()
         self.get_scale_bounds('MHWBufferEngine')
         self.get_high_water_features()
         self.build_area_features()
@@ -323,57 +315,57 @@ class MHWBufferEngine(Engine):
         self.remove_inner_polygons()
         self.clip_sheets()
         self.save_layers()
-        self.delete_enc_extents()
 
         arcpy.AddMessage('Done')
 
-    def store_coalne_features(self, layer: list[dict], enc_scale: str, display_scale: str) -> None:
+    def store_coalne_features(self, records: list[dict], enc_scale: str, display_scale: str, check_supersession=True) -> None:
         """Collect all COALNE features"""
 
-        for feature in layer:
-            if feature:
-                feature_json = json.loads(feature.ExportToJson())
-                if self.feature_covered_by_upper_scale(feature_json, int(enc_scale)):
-                    self.intersected += 1
-                    continue
-                geom_type = feature_json['geometry']['type'] if feature_json['geometry'] else False
-                if geom_type == 'LineString':
-                    feature_json['properties']['DISPLAY_SCALE'] = display_scale
-                    feature_json['properties']['ENC_SCALE'] = enc_scale
-                    self.features['COALNE'].append(feature_json)
-
-    def store_lndare_features(self, layer: list[dict], enc_scale: str, display_scale: str) -> None:
+        records = list(records)
+        if check_supersession:
+            superseded = self.features_covered_by_upper_scale([record['geometry'] for record in records], int(enc_scale))
+        else:
+            superseded = [False] * len(records)
+        for record, covered in zip(records, superseded):
+            if covered:
+                self.intersected += 1
+                continue
+            if record['type'] == 'LineString':
+                record['properties']['DISPLAY_SCALE'] = display_scale
+                record['properties']['ENC_SCALE'] = enc_scale
+                self.features['COALNE'].append(record)
+
+    def store_lndare_features(self, records: list[dict], enc_scale: str, display_scale: str) -> None:
         """Collect all LNDARE features"""
 
-        for feature in layer:
-            if feature:
-                feature_json = json.loads(feature.ExportToJson())
-                geom_type = feature_json['geometry']['type'] if feature_json['geometry'] else False
-                if geom_type == 'Polygon':
-                    feature_json['properties']['DISPLAY_SCALE'] = display_scale
-                    feature_json['properties']['ENC_SCALE'] = enc_scale
-                    self.features['LNDARE'].append(feature_json)
+        for record in records:
+            if record['type'] == 'Polygon':
+                record['properties']['DISPLAY_SCALE'] = display_scale
+                record['properties']['ENC_SCALE'] = enc_scale
+                self.features['LNDARE'].append(record)
 
-    def store_slcons_features(self, layer: list[dict], enc_scale: str, display_scale: str) -> None:
+    def store_slcons_features(self, records: list[dict], enc_scale: str, display_scale: str, check_supersession=True) -> None:
         """Collect all SLCONS features"""
 
-        for feature in layer:
-            if feature:
-                feature_json = json.loads(feature.ExportToJson())
-                if self.feature_covered_by_upper_scale(feature_json, int(enc_scale)):
-                    self.intersected += 1
-                    continue
-                geom_type = feature_json['geometry']['type'] if feature_json['geometry'] else False
-                if geom_type == 'LineString':
-                    feature_json['properties']['DISPLAY_SCALE'] = display_scale
-                    feature_json['properties']['ENC_SCALE'] = enc_scale
-                    props = feature_json['properties']
-                    if 'CATSLC' in props:
-                        if props['CATSLC'] == 4:
-                            if props['WATLEV'] == 2:
-                                self.features['SLCONS'].append(feature_json)
-                            elif props['WATLEV'] in ['', None, 'None']:  # Blank only
-                                if props['CONDTN'] in ['', None, 'None', 1, 3, 4, 5]:  # skip 2
-                                    self.features['SLCONS'].append(feature_json)
-                        else: # != 4
-                            self.features['SLCONS'].append(feature_json)
+        records = list(records)
+        if check_supersession:
+            superseded = self.features_covered_by_upper_scale([record['geometry'] for record in records], int(enc_scale))
+        else:
+            superseded = [False] * len(records)
+        for record, covered in zip(records, superseded):
+            if covered:
+                self.intersected += 1
+                continue
+            if record['type'] == 'LineString':
+                record['properties']['DISPLAY_SCALE'] = display_scale
+                record['properties']['ENC_SCALE'] = enc_scale
+                props = record['properties']
+                if 'CATSLC' in props:
+                    if props['CATSLC'] == 4:
+                        if props['WATLEV'] == 2:
+                            self.features['SLCONS'].append(record)
+                        elif props['WATLEV'] in ['', None, 'None']:  # Blank only
+                            if props['CONDTN'] in ['', None, 'None', 1, 3, 4, 5]:  # skip 2
+                                self.features['SLCONS'].append(record)
+                    else: # != 4
+                        self.features['SLCONS'].append(record)
@@ -6,10 +6,12 @@ import json
 import yaml
 import time
 import copy
+import multiprocessing
 
 from osgeo import osr, ogr
 from csf_prf.engines.Engine import Engine
 from csf_prf.engines.class_code_lookup import class_codes as CLASS_CODES
+from csf_prf.helpers.tools import Param
 arcpy.env.overwriteOutput = True
 
 
@@ -23,13 +25,30 @@ class S57ConversionEngineException(Exception):
     pass 
 
 
+def read_enc_layers(read_inputs) -> dict:
+    """
+    Read a group of layers from one ENC file in a worker process
+    - Standalone function because class methods can't be pickled
+    :param list[str | list[int]] read_inputs: ENC file path and layer indexes to read
+    :returns dict[int]: Records by geometry type for each layer index
+    """
+
+    enc_path, layer_indexes = read_inputs
+    engine = S57ConversionEngine(param_lookup={'enc_file': Param(enc_path)})
+    return engine.read_enc_layers(enc_path, layer_indexes)
+
+
 class S57ConversionEngine(Engine):
     """Class for converting S57 files to geopackage"""
 
+    # Set above 1 to split the layers of the ENC file across a pool of worker processes
+    processes = 1
+
     def __init__(self, param_lookup: dict):
         self.param_lookup = param_lookup
         self.gdb_name = pathlib.Path(param_lookup['enc_file'].valueAsText).stem
         self.output_data = {}
+        self.enc_cache_keys = {}
         self.letter_lookup = {'Point': 'P', 'LineString': 'L', 'Polygon': 'A'}
         self.layerfile_name = 'MCD_maritime_layerfile'
         self.geometries = {
@@ -108,25 +127,17 @@ class S57ConversionEngine(Engine):
                     'memory', 
                     f'{feature_type}_points_layer', 'POINT', spatial_reference=arcpy.SpatialReference(4326))
                 sorted_point_fields = sorted(point_fields)
-                for field in sorted_point_fields:
-                    arcpy.management.AddField(points_layer, field, 'TEXT', field_length=300, field_is_nullable='NULLABLE')
+                if sorted_point_fields:
+                    arcpy.management.AddFields(points_layer, self.get_field_definitions(sorted_point_fields))
 
                 arcpy.AddMessage(' - Building Point features')     
                 # 1. add geometry to fields
                 cursor_fields = ['SHAPE@XY'] + sorted_point_fields
+                build_row = self.get_row_writer(cursor_fields)
                 with arcpy.da.InsertCursor(points_layer, cursor_fields, explicit=True) as point_cursor: 
                     for feature in self.geometries['Point'][feature_type]:
-                        # Make new list all set to None
-                        attribute_values = ['' for i in range(len(cursor_fields))]
-                        # Set geometry on first index
-                        coords = feature['geojson']['geometry']['coordinates']
-                        attribute_values[0] = (coords[0], coords[1])
-                        # Set attributes based on index
-                        for fieldname, attr in list(feature['geojson']['properties'].items()):
-                            field_index = point_cursor.fields.index(fieldname)
-                            attribute_values[field_index] = str(attr)
-                        # add to cursor
-                        point_cursor.insertRow(attribute_values)
+                        # Geometry goes on the first index, attributes on their mapped index
+                        point_cursor.insertRow(build_row(self.get_point_xy(feature['geometry']), feature['properties']))
 
                 self.geometries['Point'][f'{feature_type}_layers'] = points_layer
 
@@ -137,20 +148,16 @@ class S57ConversionEngine(Engine):
                     'memory', 
                     f'{feature_type}_lines_layer', 'POLYLINE', spatial_reference=arcpy.SpatialReference(4326))
                 sorted_line_fields = sorted(line_fields)
-                for field in sorted_line_fields:
-                    arcpy.management.AddField(lines_layer, field, 'TEXT', field_length=300, field_is_nullable='NULLABLE')
+                if sorted_line_fields:
+                    arcpy.management.AddFields(lines_layer, self.get_field_definitions(sorted_line_fields))
 
                 arcpy.AddMessage(' - Building Line features')
-                cursor_fields = ['SHAPE@JSON'] + sorted_line_fields
+                # WKB bytes are written as they are, without building arcpy geometry
+                cursor_fields = ['SHAPE@WKB'] + sorted_line_fields
+                build_row = self.get_row_writer(cursor_fields)
                 with arcpy.da.InsertCursor(lines_layer, cursor_fields, explicit=True) as line_cursor: 
                     for feature in self.geometries['LineString'][feature_type]:
-                        attribute_values = ['' for i in range(len(cursor_fields))]
-                        geometry = feature['geojson']['geometry']
-                        attribute_values[0] = arcpy.AsShape(geometry).JSON
-                        for fieldname, attr in list(feature['geojson']['properties'].items()):
-                            field_index = line_cursor.fields.index(fieldname)
-                            attribute_values[field_index] = str(attr)
-                        line_cursor.insertRow(attribute_values)
+                        line_cursor.insertRow(build_row(feature['geometry'], feature['properties']))
 
                 self.geometries['LineString'][f'{feature_type}_layers'] = lines_layer        
 
@@ -161,30 +168,17 @@ class S57ConversionEngine(Engine):
                     'memory', 
                     f'{feature_type}_polygons_layer', 'POLYGON', spatial_reference=arcpy.SpatialReference(4326))
                 sorted_polygon_fields = sorted(polygons_fields)
-                for field in sorted_polygon_fields:
-                    arcpy.management.AddField(polygons_layer, field, 'TEXT', field_length=300, field_is_nullable='NULLABLE')
+                if sorted_polygon_fields:
+                    arcpy.management.AddFields(polygons_layer, self.get_field_definitions(sorted_polygon_fields))
 
                 arcpy.AddMessage(' - Building Polygon features')
-                cursor_fields = ['SHAPE@'] + sorted_polygon_fields
+                cursor_fields = ['SHAPE@WKB'] + sorted_polygon_fields
+                build_row = self.get_row_writer(cursor_fields)
                 with arcpy.da.InsertCursor(polygons_layer, cursor_fields, explicit=True) as polygons_cursor: 
                     for feature in self.geometries['Polygon'][feature_type]:
-                        attribute_values = ['' for i in range(len(cursor_fields))]
-                        polygons = feature['geojson']['geometry']['coordinates']
-                        if polygons:
-                            # 1 polygon is single, > 1 is outer and inners
-                            point_arrays = arcpy.Array()
-                            for polygon in polygons:
-                                points = []
-                                for point in polygon:
-                                    points.append(arcpy.Point(*point))
-                                points.append(arcpy.Point(*polygon[0]))  # close the polygon
-                                point_arrays.add(arcpy.Array(points))
-                            attribute_values[0] = arcpy.Polygon(point_arrays, arcpy.SpatialReference(4326))
-
-                            for fieldname, attr in list(feature['geojson']['properties'].items()):
-                                field_index = polygons_cursor.fields.index(fieldname)
-                                attribute_values[field_index] = str(attr)
-                            polygons_cursor.insertRow(attribute_values)   
+                        if feature['geometry']:
+                            # WKB holds the outer ring and any inner rings
+                            polygons_cursor.insertRow(build_row(feature['geometry'], feature['properties']))
 
                 self.geometries['Polygon'][f'{feature_type}_layers'] = polygons_layer    
 
@@ -196,7 +190,7 @@ class S57ConversionEngine(Engine):
             vector_records = self.geometries[geom_type]['QUAPOS']
             if len(feature_records) < len(vector_records):
                 arcpy.AddMessage('Error: Too many QUAPOS vector records found!\nReview ".000" file for feature validity.')
-                arcpy.AddMessage(f' - potential invalid features: {json.dumps([record["geojson"] for record in vector_records], indent=4)}')
+                arcpy.AddMessage(f' - potential invalid features: {json.dumps([record["properties"] for record in vector_records], indent=4)}')
                 sys.exit()
             
             if not feature_records and not vector_records:
@@ -212,6 +206,7 @@ class S57ConversionEngine(Engine):
         for feature_type in self.geometries.keys():
             arcpy.AddMessage(f'Update field values for: {feature_type}')
             invalid_field_names = set()
+            text_lengths = self.get_text_lengths(self.geometries[feature_type]['output'])
             with arcpy.da.UpdateCursor(self.geometries[feature_type]['output'], ['*']) as updateCursor:
                 fields = updateCursor.fields
                 for row in updateCursor:
@@ -223,10 +218,10 @@ class S57ConversionEngine(Engine):
                             if current_value:
                                 try:
                                     new_value = s57_lookup[field_name][int(current_value)]
-                                    new_row.append(new_value)
+                                    new_row.append(self.truncate_text(new_value, text_lengths.get(field_name)))
                                 except ValueError as e: # current_value has multiple values
                                     multiple_value_result = self.get_multiple_values_from_field(field_name, current_value, s57_lookup)
-                                    new_row.append(multiple_value_result)
+                                    new_row.append(self.truncate_text(multiple_value_result, text_lengths.get(field_name)))
                                     pass
                                 except KeyError as e: # current_value is invalid ie. 2147483641
                                     new_row.append(current_value)
@@ -283,39 +278,42 @@ class S57ConversionEngine(Engine):
                     arcpy.management.CopyFeatures(self.geometries[geom_type][f'{feature_type}_layers'], output_name)
                     self.output_data[f'{assigned_name}'] = output_name
 
-    def get_feature_records(self) -> None:
-        """Read and store all features from ENC file"""
+    def get_enc_records(self) -> None:
+        """Read and store all feature and QUAPOS vector records from ENC file in a single pass"""
 
-        arcpy.AddMessage(' - Reading Feature records')
+        arcpy.AddMessage(' - Reading Feature and QUAPOS records')
         enc_path = self.param_lookup['enc_file'].valueAsText
-        enc_file = self.open_file(enc_path) 
-        for layer in enc_file:
-            layer.ResetReading()
-            for feature in layer:
-                if feature:
-                    feature_json = json.loads(feature.ExportToJson())
-                    geom_type = feature_json['geometry']['type'] if feature_json['geometry'] else False
-                    if geom_type in ['Point', 'LineString', 'Polygon'] and feature_json['geometry']['coordinates']:
-                        feature_json = self.set_none_to_null(feature_json) 
-                        feature_json['properties'] = self.convert_illegal_chars(feature_json['properties'])
-                        self.geometries[geom_type]['features'].append({'geojson': feature_json})
-
-    def get_vector_records(self) -> None:
-        """Read and store all vector records with QUAPOS from ENC file"""
-
-        arcpy.AddMessage(' - Reading QUAPOS records')
-        enc_path = self.param_lookup['enc_file'].valueAsText
-        enc_file = self.open_file(enc_path)
-        for layer in enc_file:
-            layer.ResetReading()
-            for feature in layer:
-                if feature:
-                    feature_json = json.loads(feature.ExportToJson())
-                    if 'QUAPOS' in feature_json['properties'] and feature_json['properties']['QUAPOS'] is not None:
-                        print("quapos:", feature_json['properties']['QUAPOS'])
-                        geom_type = feature_json['geometry']['type'] if feature_json['geometry'] else False  
-                        if geom_type in ['Point', 'LineString', 'Polygon'] and feature_json['geometry']['coordinates']:
-                            self.geometries[geom_type]['QUAPOS'].append({'geojson': feature_json})
+        cell = self.get_enc_cell(enc_path)
+        if cell:
+            # Cached records are already normalized and only primitives with QUAPOS are kept
+            for layer in cell['layers']:
+                feature_type = 'QUAPOS' if layer['name'] in self.s57_primitive_layers else 'features'
+                for record in layer['records']:
+                    self.geometries[record['type']][feature_type].append(record)
+            return
+
+        layer_count = self.open_enc_file(enc_path, 'records').GetLayerCount()
+        layer_indexes = list(range(layer_count))
+        if self.processes > 1 and layer_count > 1:
+            processes = min(self.processes, layer_count)
+            arcpy.AddMessage(f'  - Reading {layer_count} layers with {processes} processes')
+            if sys.platform == 'win32':
+                multiprocessing.set_executable(os.path.join(sys.exec_prefix, 'pythonw.exe'))
+            # Each worker opens its own dataset and reads every nth layer to balance large layers
+            layer_groups = [layer_indexes[process::processes] for process in range(processes)]
+            with multiprocessing.Pool(processes=processes) as pool:
+                group_records = pool.map(read_enc_layers, [(enc_path, layer_group) for layer_group in layer_groups])
+            layer_records = {}
+            for records in group_records:
+                layer_records.update(records)
+        else:
+            layer_records = self.read_enc_layers(enc_path, layer_indexes)
+
+        # Merge in layer order so output matches a serial read
+        for layer_index in sorted(layer_records):
+            for geom_type in self.geometries:
+                self.geometries[geom_type]['features'].extend(layer_records[layer_index]['features'][geom_type])
+                self.geometries[geom_type]['QUAPOS'].extend(layer_records[layer_index]['QUAPOS'][geom_type])
 
     def join_quapos_to_features(self) -> None:
         """Spatial join the QUAPOS tables to features tables"""
@@ -398,14 +396,46 @@ class S57ConversionEngine(Engine):
             else:
                 arcpy.AddMessage(f'  -{fc_name} did not need a transformation.')                                                                     
 
+    def read_enc_layers(self, enc_path, layer_indexes) -> dict:
+        """
+        Read the feature and QUAPOS vector records of selected layers in an ENC file
+        :param str enc_path: Path to an ENC file on disk
+        :param list[int] layer_indexes: Indexes of the layers to read
+        :returns dict[int]: Records by geometry type for each layer index
+        """
+
+        enc_file = self.open_enc_file(enc_path, 'records')
+        layer_records = {}
+        for layer_index in layer_indexes:
+            records = {
+                'features': {geom_type: [] for geom_type in self.geometries},
+                'QUAPOS': {geom_type: [] for geom_type in self.geometries}
+            }
+            layer = enc_file.GetLayer(layer_index)
+            layer.ResetReading()
+            field_names = self.get_field_names(layer)
+            # Primitive layers hold the QUAPOS vector records, all other layers hold feature records
+            primitive_layer = layer.GetName() in self.s57_primitive_layers
+            for feature in layer:
+                if feature:
+                    record = self.get_feature_record(feature, field_names)
+                    geom_type = record['type']
+                    if geom_type not in ['Point', 'LineString', 'Polygon']:
+                        continue
+                    if primitive_layer:
+                        if record['properties'].get('QUAPOS') is not None:
+                            records['QUAPOS'][geom_type].append(record)
+                    else:
+                        record = self.set_none_to_null(record) 
+                        record['properties'] = self.convert_illegal_chars(record['properties'])
+                        records['features'][geom_type].append(record)
+            layer_records[layer_index] = records
+        return layer_records
+
     def start(self) -> None:
         start = time.time()
         self.create_output_gdb(gdb_name=self.gdb_name)
-        self.set_driver()
-        self.split_multipoint_env() 
-        self.get_feature_records()
-        self.return_primitives_env()
-        self.get_vector_records()
+        self.get_enc_records()
         self.catch_invalid_records()
         self.build_output_layers()
         self.add_objl_string_to_S57() 
@@ -26,7 +26,11 @@ if __name__ == '__main__':
     }
     csf_engine = CompositeSourceCreatorEngine(param_lookup)
     csf_engine.convert_sheets()
-    engine = ENCReaderEngine(param_lookup, csf_engine.sheets_layer)
+    engine = ENCReaderEngine(param_lookup, csf_engine.sheets_layer, csf_engine.prepared_sheets)
+    # engine.processes = 8  # read ENC files in parallel
+    # engine.stream_records = True  # write records while reading to keep memory flat
+    # engine.geometry_processes = True  # filter and write each geometry type in its own process
+    # engine.enc_cache_folder = pathlib.Path.home() / '.csf_prf' / 'enc_cache'  # keep parsed ENC files between runs
     start = time.time()
     engine.start()
     print(f'Run time: {(time.time() - start) / 60}')
\ No newline at end of file
@@ -19,4 +19,5 @@ if __name__ == "__main__":
         "toggle_crs": Param(True)
     }
     engine = S57ConversionEngine(param_lookup)
+    # engine.processes = 4  # read ENC layers in parallel
     engine.start()
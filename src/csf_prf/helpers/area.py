@@ -0,0 +1,86 @@
+import numpy as np
+import shapely
+
+
+# GRS 1980 ellipsoid and standard parallels of ESRI:102008 North America Albers Equal Area Conic
+SEMI_MAJOR_AXIS = 6378137.0
+FLATTENING = 1 / 298.257222101
+ECCENTRICITY = np.sqrt(2 * FLATTENING - FLATTENING ** 2)
+CENTRAL_MERIDIAN = -96.0
+LATITUDE_OF_ORIGIN = 40.0
+STANDARD_PARALLELS = (20.0, 60.0)
+
+
+def get_authalic_q(latitudes: np.ndarray) -> np.ndarray:
+    """
+    Compute the authalic q value of latitudes on the ellipsoid
+    :param np.ndarray latitudes: Latitudes in degrees
+    :returns np.ndarray: q values used by the Albers equal area projection
+    """
+
+    sin_latitudes = np.sin(np.radians(latitudes))
+    e_sin = ECCENTRICITY * sin_latitudes
+    return (1 - ECCENTRICITY ** 2) * (sin_latitudes / (1 - e_sin ** 2)
+                                     - np.log((1 - e_sin) / (1 + e_sin)) / (2 * ECCENTRICITY))
+
+
+def get_albers_constants() -> tuple[float, float, float]:
+    """
+    Compute the cone constant, C and origin radius of the North America Albers projection
+    :returns tuple[float]: n, C and rho0 of the projection
+    """
+
+    first, second = np.radians(STANDARD_PARALLELS)
+    m1 = np.cos(first) / np.sqrt(1 - ECCENTRICITY ** 2 * np.sin(first) ** 2)
+    m2 = np.cos(second) / np.sqrt(1 - ECCENTRICITY ** 2 * np.sin(second) ** 2)
+    q1, q2 = get_authalic_q(np.array(STANDARD_PARALLELS))
+    n = (m1 ** 2 - m2 ** 2) / (q2 - q1)
+    c = m1 ** 2 + n * q1
+    rho0 = SEMI_MAJOR_AXIS * np.sqrt(c - n * get_authalic_q(LATITUDE_OF_ORIGIN)) / n
+    return n, c, rho0
+
+
+N, C, RHO0 = get_albers_constants()
+
+
+def project_albers(coordinates: np.ndarray) -> np.ndarray:
+    """
+    Project WGS84 coordinates to North America Albers Equal Area Conic
+    - Matches ESRI:102008 without a datum transformation, the same as arcpy projectAs()
+    :param np.ndarray coordinates: N x 2 array of longitude and latitude
+    :returns np.ndarray: N x 2 array of x and y in meters
+    """
+
+    rho = SEMI_MAJOR_AXIS * np.sqrt(C - N * get_authalic_q(coordinates[:, 1])) / N
+    theta = N * np.radians(coordinates[:, 0] - CENTRAL_MERIDIAN)
+    return np.column_stack([rho * np.sin(theta), RHO0 - rho * np.cos(theta)])
+
+
+def get_polygon_areas(polygons_wkb: list[bytes]) -> np.ndarray:
+    """
+    Compute the equal area size of many WGS84 polygons in one vectorized call
+    - Every vertex is projected at once and ring areas use the shoelace formula
+    - Used to skip large LNDARE polygons before any arcpy geometry is built
+    :param list[bytes] polygons_wkb: WKB polygons or multipolygons in WGS84
+    :returns np.ndarray: Area of each polygon in square meters
+    """
+
+    if not polygons_wkb:
+        return np.zeros(0)
+    polygons = shapely.from_wkb(np.array(polygons_wkb, dtype=object))
+    parts, part_indices = shapely.get_parts(polygons, return_index=True)
+    rings, ring_part_indices = shapely.get_rings(parts, return_index=True)
+    if not rings.size:
+        return np.zeros(len(polygons))
+    # get_rings() lists the exterior of each part first, the holes after it are subtracted
+    is_hole = np.r_[False, ring_part_indices[1:] == ring_part_indices[:-1]]
+    coordinates, vertex_ring_indices = shapely.get_coordinates(rings, return_index=True)
+    projected = project_albers(coordinates)
+    # Shoelace terms of each segment, rings are closed so the last vertex of a ring starts no segment
+    next_vertex = np.r_[projected[1:], projected[:1]]
+    cross = projected[:, 0] * next_vertex[:, 1] - next_vertex[:, 0] * projected[:, 1]
+    cross[np.r_[vertex_ring_indices[1:] != vertex_ring_indices[:-1], True]] = 0
+    ring_areas = np.abs(np.bincount(vertex_ring_indices, weights=cross, minlength=len(rings))) / 2
+    ring_areas[is_hole] *= -1
+    part_areas = np.bincount(ring_part_indices, weights=ring_areas, minlength=len(parts))
+    return np.bincount(part_indices, weights=part_areas, minlength=len(polygons))
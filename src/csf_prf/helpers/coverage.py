@@ -0,0 +1,192 @@
+import numpy as np
+import shapely
+
+
+# Grid cell states of ScaleCoverage.grid
+CLEAR = 0
+COVERED = 1
+BOUNDARY = 2
+
+
+class ScaleCoverage:
+    """
+    Coverage polygons indexed for bulk intersection tests
+    - Used for upper scale ENC coverage in supersession and for assigning records to the Sheets
+    - Polygons are kept separate in an STR-tree instead of one unioned polygon
+    - Each test rejects polygons by envelope first, then uses prepared polygons
+    - A grid over the coverage answers features that fall inside a single covered or clear grid cell without a geometry test
+    - Polygons with many vertices, on either side of a test, are split into pieces so each test only sees nearby vertices
+    """
+
+    # Number of grid cells along each axis of the coverage extent
+    grid_size = 128
+    # Polygons with more vertices are split into pieces for intersection tests.  Set to None to keep whole polygons
+    max_vertices = 256
+
+    def __init__(self, polygons_wkb: list[bytes]):
+        self.polygons_wkb = [bytes(polygon) for polygon in polygons_wkb]
+        self.build()
+
+    def __getstate__(self) -> dict:
+        """Only pickle the WKB polygons for worker processes"""
+
+        return {'polygons_wkb': self.polygons_wkb}
+
+    def __setstate__(self, state: dict) -> None:
+        """Rebuild the STR-tree and grid in a worker process"""
+
+        self.polygons_wkb = state['polygons_wkb']
+        self.build()
+
+    def build(self) -> None:
+        """Load, subdivide and prepare the coverage polygons and build the STR-tree and grid"""
+
+        if self.max_vertices:
+            pieces, piece_indices = subdivide_polygons(self.polygons_wkb, self.max_vertices)
+        else:
+            pieces, piece_indices = self.polygons_wkb, range(len(self.polygons_wkb))
+        self.polygons = shapely.from_wkb(np.array(pieces, dtype=object))
+        # Index of the coverage polygon each piece came from
+        self.piece_indices = np.array(piece_indices, dtype=int)
+        shapely.prepare(self.polygons)
+        self.tree = shapely.STRtree(self.polygons)
+        self.build_grid()
+
+    def build_grid(self) -> None:
+        """Mark each grid cell over the coverage extent as clear, covered or boundary"""
+
+        self.bounds = shapely.total_bounds(self.polygons)
+        x_min, y_min, x_max, y_max = self.bounds
+        self.cell_width = (x_max - x_min) / self.grid_size
+        self.cell_height = (y_max - y_min) / self.grid_size
+        if not self.cell_width > 0 or not self.cell_height > 0:
+            # No usable extent, every feature uses the exact test
+            self.grid = None
+            return
+
+        columns, rows = np.meshgrid(np.arange(self.grid_size), np.arange(self.grid_size))
+        cells = shapely.box(x_min + columns * self.cell_width, y_min + rows * self.cell_height,
+                            x_min + (columns + 1) * self.cell_width, y_min + (rows + 1) * self.cell_height)
+        self.grid = np.full(cells.shape, CLEAR, dtype=np.int8)
+        touched, _ = self.tree.query(cells.ravel(), predicate='intersects')
+        touched = np.unique(touched)
+        coverage = shapely.union_all(self.polygons)
+        shapely.prepare(coverage)
+        covered = shapely.covers(coverage, cells.ravel()[touched])
+        self.grid.ravel()[touched] = np.where(covered, COVERED, BOUNDARY)
+
+    def classify(self, geometries: list[bytes]) -> str:
+        """
+        Compare the coverage polygons of a whole ENC file against the upper scale coverage
+        :param list[bytes] geometries: WKB coverage polygons of an ENC file
+        :returns str: covered if every polygon is inside the upper scale coverage, clear if none touch it, otherwise partial
+        """
+
+        geometries = shapely.from_wkb(np.array(geometries, dtype=object))
+        _, nearby = self.tree.query(geometries, predicate='intersects')
+        if not nearby.size:
+            return 'clear'
+        upper_coverage = shapely.union_all(self.polygons[np.unique(nearby)])
+        if shapely.covers(upper_coverage, geometries).all():
+            return 'covered'
+        return 'partial'
+
+    def get_grid_states(self, geometries: np.ndarray) -> np.ndarray:
+        """
+        Look up the grid cell state of each geometry envelope
+        :param np.ndarray geometries: Shapely geometries, None for features without geometry
+        :returns np.ndarray: CLEAR or COVERED where the envelope is inside a single uniform grid cell or outside the grid, otherwise BOUNDARY
+        """
+
+        states = np.full(len(geometries), BOUNDARY, dtype=np.int8)
+        bounds = shapely.bounds(geometries)
+        missing = np.isnan(bounds[:, 0])
+        x_min, y_min, x_max, y_max = self.bounds
+        with np.errstate(invalid='ignore'):
+            outside = (bounds[:, 2] < x_min) | (bounds[:, 0] > x_max) | (bounds[:, 3] < y_min) | (bounds[:, 1] > y_max)
+            states[outside | missing] = CLEAR
+            if self.grid is None:
+                return states
+            inside = (bounds[:, 0] >= x_min) & (bounds[:, 2] <= x_max) & (bounds[:, 1] >= y_min) & (bounds[:, 3] <= y_max)
+        bounds = np.nan_to_num(bounds)
+        last_cell = self.grid_size - 1
+        first_columns = np.clip(((bounds[:, 0] - x_min) // self.cell_width).astype(int), 0, last_cell)
+        last_columns = np.clip(((bounds[:, 2] - x_min) // self.cell_width).astype(int), 0, last_cell)
+        first_rows = np.clip(((bounds[:, 1] - y_min) // self.cell_height).astype(int), 0, last_cell)
+        last_rows = np.clip(((bounds[:, 3] - y_min) // self.cell_height).astype(int), 0, last_cell)
+        single_cell = inside & (first_columns == last_columns) & (first_rows == last_rows)
+        states[single_cell] = self.grid[first_rows[single_cell], first_columns[single_cell]]
+        return states
+
+    def intersects(self, geometry: bytes) -> bool:
+        """
+        Check if a geometry intersects any of the coverage polygons
+        :param bytes geometry: WKB geometry
+        :returns bool: True if the geometry intersects the coverage
+        """
+
+        return bool(self.intersects_all([geometry])[0])
+
+    def intersects_all(self, geometries: list[bytes]) -> np.ndarray:
+        """
+        Check a whole layer of geometries against the coverage polygons in one vectorized call
+        - Only geometries on boundary grid cells use the exact test
+        - Large polygons are tested as pieces and their results are mapped back to the polygon
+        :param list[bytes] geometries: WKB geometries, None for features without geometry
+        :returns np.ndarray: Boolean mask, True where a geometry intersects the coverage
+        """
+
+        if not geometries:
+            return np.zeros(0, dtype=bool)
+        geometries = shapely.from_wkb(np.array(geometries, dtype=object))
+        states = self.get_grid_states(geometries)
+        superseded = states == COVERED
+        boundary = np.flatnonzero(states == BOUNDARY)
+        if boundary.size:
+            boundary_geometries = geometries[boundary]
+            large = np.zeros(boundary.size, dtype=bool)
+            if self.max_vertices:
+                polygonal = np.isin(shapely.get_type_id(boundary_geometries), [shapely.GeometryType.POLYGON, shapely.GeometryType.MULTIPOLYGON])
+                large = polygonal & (shapely.get_num_coordinates(boundary_geometries) > self.max_vertices)
+            intersected, _ = self.tree.query(boundary_geometries[~large], predicate='intersects')
+            superseded[boundary[~large][intersected]] = True
+            if large.any():
+                pieces, piece_indices = subdivide_polygons(shapely.to_wkb(boundary_geometries[large]).tolist(), self.max_vertices)
+                intersected, _ = self.tree.query(shapely.from_wkb(np.array(pieces, dtype=object)), predicate='intersects')
+                superseded[boundary[large][np.array(piece_indices, dtype=int)[intersected]]] = True
+        return superseded
+
+
+def subdivide_polygons(polygons_wkb: list[bytes], max_vertices=256, max_depth=16) -> tuple[list[bytes], list[int]]:
+    """
+    Split polygons with many vertices into smaller pieces for faster intersection tests
+    - Pieces are halved across the longest side of their envelope until each has max_vertices or less
+    - Pieces cover the same area as the polygon, so a feature intersects the polygon if it intersects a piece
+    :param list[bytes] polygons_wkb: WKB polygons or multipolygons
+    :param int max_vertices: Largest number of vertices kept in one piece
+    :param int max_depth: Largest number of splits of one polygon
+    :returns tuple[list]: WKB pieces and the index of the polygon each piece came from
+    """
+
+    pieces = []
+    piece_indices = []
+    polygons = shapely.from_wkb(np.array(polygons_wkb, dtype=object))
+    parts, part_indices = shapely.get_parts(polygons, return_index=True)
+    pending = [(part, int(index), 0) for part, index in zip(parts, part_indices)]
+    while pending:
+        polygon, index, depth = pending.pop()
+        if shapely.get_num_coordinates(polygon) <= max_vertices or depth >= max_depth:
+            pieces.append(shapely.to_wkb(polygon))
+            piece_indices.append(index)
+            continue
+        x_min, y_min, x_max, y_max = polygon.bounds
+        if x_max - x_min >= y_max - y_min:
+            middle = (x_min + x_max) / 2
+            halves = [shapely.clip_by_rect(polygon, x_min, y_min, middle, y_max), shapely.clip_by_rect(polygon, middle, y_min, x_max, y_max)]
+        else:
+            middle = (y_min + y_max) / 2
+            halves = [shapely.clip_by_rect(polygon, x_min, y_min, x_max, middle), shapely.clip_by_rect(polygon, x_min, middle, x_max, y_max)]
+        for half in shapely.get_parts(halves):
+            if isinstance(half, shapely.Polygon) and not half.is_empty:
+                pending.append((half, index, depth + 1))
+    return pieces, piece_indices
@@ -0,0 +1,206 @@
+import hashlib
+import os
+import pathlib
+import pickle
+
+
+# Increase when the cached record format changes so old cache files are never loaded
+CACHE_VERSION = 2
+
+
+def get_dsid_edition(enc_path) -> tuple[str, str]:
+    """
+    Read the DSID edition and update numbers from the first ISO 8211 data record of an ENC file
+    - Avoids opening the ENC file with GDAL, which reads every record
+    :param str enc_path: Path to an ENC file on disk
+    :returns tuple[str]: EDTN and UPDN values, empty strings if the DSID field can't be read
+    """
+
+    with open(enc_path, 'rb') as enc_file:
+        ddr_leader = enc_file.read(24)
+        try:
+            enc_file.seek(int(ddr_leader[0:5]))
+            leader = enc_file.read(24)
+            record = leader + enc_file.read(int(leader[0:5]) - 24)
+            field_area = int(leader[12:17])
+            length_size, position_size, tag_size = int(leader[20:21]), int(leader[21:22]), int(leader[23:24])
+        except ValueError:
+            return '', ''
+
+    entry_size = tag_size + length_size + position_size
+    for entry_start in range(24, field_area - 1, entry_size):
+        entry = record[entry_start:entry_start + entry_size]
+        if entry[:tag_size] == b'DSID':
+            length = int(entry[tag_size:tag_size + length_size])
+            position = int(entry[tag_size + length_size:])
+            dsid = record[field_area + position:field_area + position + length]
+            # RCNM, RCID, EXPP and INTU are 7 bytes of binary values before DSNM, EDTN and UPDN
+            values = dsid[7:].split(b'\x1f')
+            if len(values) > 2:
+                return values[1].decode('ascii', 'ignore'), values[2].decode('ascii', 'ignore')
+    return '', ''
+
+
+class ENCCache:
+    """
+    Size bounded cache of parsed ENC files on disk
+    - Each file stores a pickled summary with metadata and M_COVR records, then the records of every layer
+    - Scale coverages for a set of ENC file editions are stored in small .scales files next to them
+    - Files are removed least recently used first once the folder is larger than max_size
+    """
+
+    def __init__(self, cache_folder, max_size: int):
+        self.cache_folder = pathlib.Path(cache_folder)
+        self.max_size = max_size
+
+    def evict(self) -> None:
+        """Remove the least recently used cache files until the cache fits in max_size"""
+
+        cache_files = []
+        for cache_file in list(self.cache_folder.glob('*.cell')) + list(self.cache_folder.glob('*.scales')):
+            try:
+                stats = cache_file.stat()
+            except OSError:
+                continue
+            cache_files.append((stats.st_mtime, stats.st_size, cache_file))
+
+        cache_size = sum(size for _, size, _ in cache_files)
+        for _, size, cache_file in sorted(cache_files, key=lambda cache: cache[0]):
+            if cache_size <= self.max_size:
+                break
+            try:
+                cache_file.unlink()
+            except FileNotFoundError:
+                # Another process already removed it
+                pass
+            except OSError:
+                # Another process is reading it, which blocks removal on Windows
+                continue
+            cache_size -= size
+
+    def get_cache_path(self, key: str, suffix='.cell') -> pathlib.Path:
+        """
+        Build the cache file path for a key
+        :param str key: Cache key from ENCCache.get_key() or ENCCache.get_coverage_key()
+        :param str suffix: .cell for parsed ENC files, .scales for scale coverages
+        :returns pathlib.Path: Path to the cache file
+        """
+
+        return self.cache_folder / f'{key}{suffix}'
+
+    def get_coverage_key(self, settings: list[str], editions: list[str]) -> str:
+        """
+        Build the cache key for the scale coverages of a set of ENC files
+        :param list[str] settings: Engine name and any values used to build the coverages
+        :param list[str] editions: ENC file editions from ENCCache.get_edition()
+        :returns str: Cache key
+        """
+
+        editions_hash = hashlib.sha256('\n'.join(settings + sorted(editions)).encode('utf-8'))
+        return f'coverage_v{CACHE_VERSION}_{editions_hash.hexdigest()[:16]}'
+
+    def get_edition(self, enc_path, update_paths=None) -> str:
+        """
+        Build the name, edition and update label of an ENC file without reading its records
+        :param str enc_path: Path to an ENC file on disk
+        :param list[str] update_paths: Sorted .001, .002... update files applied to the ENC file
+        :returns str: ENC file name with its EDTN and UPDN values
+        """
+
+        edition, update = get_dsid_edition(enc_path)
+        if update_paths:
+            update = get_dsid_edition(update_paths[-1])[1]
+        return f'{pathlib.Path(enc_path).stem}_{edition}_{update}'
+
+    def get_key(self, enc_path, update_paths=None) -> str:
+        """
+        Build the cache key for an ENC file from its name, edition, update and content
+        :param str enc_path: Path to an ENC file on disk
+        :param list[str] update_paths: Sorted .001, .002... update files applied to the ENC file
+        :returns str: Cache key
+        """
+
+        update_paths = update_paths or []
+        content_hash = hashlib.sha256()
+        for path in [enc_path] + update_paths:
+            with open(path, 'rb') as enc_file:
+                for chunk in iter(lambda: enc_file.read(1024 * 1024), b''):
+                    content_hash.update(chunk)
+        return f'{self.get_edition(enc_path, update_paths)}_v{CACHE_VERSION}_{content_hash.hexdigest()[:16]}'
+
+    def load(self, key: str, summary_only=False) -> dict:
+        """
+        Load a parsed ENC file from the cache
+        :param str key: Cache key from ENCCache.get_key()
+        :param bool summary_only: Only load metadata and M_COVR records
+        :returns dict[str]|None: Parsed ENC file, None if it is not cached
+        """
+
+        cache_path = self.get_cache_path(key)
+        try:
+            with open(cache_path, 'rb') as cache_file:
+                cell = pickle.load(cache_file)
+                if not summary_only:
+                    cell['layers'] = pickle.load(cache_file)
+            # Mark as recently used for eviction
+            os.utime(cache_path)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        return cell
+
+    def load_coverage(self, key: str) -> dict:
+        """
+        Load the scale coverages of a set of ENC files from the cache
+        :param str key: Cache key from ENCCache.get_coverage_key()
+        :returns dict[str]|None: WKB scale coverages, None if they are not cached
+        """
+
+        cache_path = self.get_cache_path(key, '.scales')
+        try:
+            with open(cache_path, 'rb') as cache_file:
+                coverage = pickle.load(cache_file)
+            os.utime(cache_path)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        return coverage
+
+    def store(self, key: str, cell: dict) -> None:
+        """
+        Write a parsed ENC file to the cache
+        :param str key: Cache key from ENCCache.get_key()
+        :param dict[str] cell: Parsed ENC file with metadata, coverage and layers
+        """
+
+        summary = {name: value for name, value in cell.items() if name != 'layers'}
+        self.write(self.get_cache_path(key), [summary, cell['layers']])
+
+    def store_coverage(self, key: str, coverage: dict) -> None:
+        """
+        Write the scale coverages of a set of ENC files to the cache
+        :param str key: Cache key from ENCCache.get_coverage_key()
+        :param dict[str] coverage: WKB scale coverages
+        """
+
+        self.write(self.get_cache_path(key, '.scales'), [coverage])
+
+    def write(self, cache_path: pathlib.Path, values: list) -> None:
+        """
+        Pickle values to a cache file one after another
+        :param pathlib.Path cache_path: Path to the cache file
+        :param list values: Objects to pickle in order
+        """
+
+        self.cache_folder.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so other processes never load a partial file
+        temp_path = cache_path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(temp_path, 'wb') as cache_file:
+            for value in values:
+                pickle.dump(value, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        try:
+            os.replace(temp_path, cache_path)
+        except OSError:
+            # Another process is reading the cache file, which blocks replacing it on Windows.
+            # The cache file it is reading holds the same values, so this copy is dropped
+            temp_path.unlink(missing_ok=True)
+            return
+        self.evict()
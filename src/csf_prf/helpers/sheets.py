@@ -0,0 +1,47 @@
+import numpy as np
+import shapely
+
+from csf_prf.helpers.coverage import ScaleCoverage
+
+
+class PreparedSheets:
+    """
+    Sheets polygons loaded, repaired, subdivided and indexed once per run
+    - Handed to every step that tests features against the Sheets instead of reading the Sheets layer again
+    - ScaleCoverage splits Sheets polygons with many vertices into pieces
+    - Only WKB is pickled, the indexes are rebuilt by ScaleCoverage in worker processes
+    """
+
+    def __init__(self, sheets_wkb: list[bytes], buffer_wkb: list[bytes]=None):
+        self.sheets_wkb = self.repair(sheets_wkb)
+        self.buffer_wkb = self.repair(buffer_wkb or [])
+        self.coverage = ScaleCoverage(self.sheets_wkb)
+        self.buffer_coverage = ScaleCoverage(self.buffer_wkb) if self.buffer_wkb else None
+        self.envelope = self.get_envelope(self.buffer_wkb or self.sheets_wkb)
+
+    def get_envelope(self, polygons_wkb: list[bytes]) -> bytes:
+        """
+        Build a multipolygon of the envelope of each polygon
+        :param list[bytes] polygons_wkb: WKB polygons
+        :returns bytes: WKB multipolygon of the envelopes, used as an OGR spatial filter
+        """
+
+        envelopes = shapely.envelope(shapely.from_wkb(np.array(polygons_wkb, dtype=object)))
+        return shapely.to_wkb(shapely.multipolygons(envelopes))
+
+    def repair(self, polygons_wkb: list[bytes]) -> list[bytes]:
+        """
+        Fix invalid polygons and drop empty or non-polygon results
+        :param list[bytes] polygons_wkb: WKB polygons
+        :returns list[bytes]: Valid WKB polygons and multipolygons
+        """
+
+        polygons = shapely.from_wkb(np.array([bytes(polygon) for polygon in polygons_wkb if polygon], dtype=object))
+        repaired = []
+        for polygon in shapely.make_valid(polygons):
+            if not isinstance(polygon, (shapely.Polygon, shapely.MultiPolygon)):
+                # make_valid() returns a collection when it also finds lines or points
+                polygon = shapely.union_all([part for part in shapely.get_parts(polygon) if isinstance(part, (shapely.Polygon, shapely.MultiPolygon))])
+            if isinstance(polygon, (shapely.Polygon, shapely.MultiPolygon)) and not polygon.is_empty:
+                repaired.append(shapely.to_wkb(polygon))
+        return repaired
@@ -0,0 +1,77 @@
+import pytest
+import pathlib
+import shutil
+import zipfile
+import arcpy
+
+from csf_prf.helpers.tools import Param
+from csf_prf.engines import ENCDownloaderEngine as downloader_module
+from csf_prf.engines.ENCDownloaderEngine import ENCDownloaderEngine
+
+
+REPO = pathlib.Path(__file__).parents[2]
+INPUTS = REPO / 'inputs'
+
+ENC_FILE = INPUTS / 'US4GA17M.000'
+SHEETS_LAYER = str(INPUTS / 'test_shapefiles' / 'G322_Sheets_01302024.shp')
+
+
+@pytest.fixture
+def victim(tmp_path):
+    victim = ENCDownloaderEngine(param_lookup={'sheets': Param(SHEETS_LAYER), 'output_folder': Param(str(tmp_path))})
+    return victim
+
+
+def test_enc_file_outdated(victim, monkeypatch):
+    monkeypatch.setattr(victim, 'get_local_edition', lambda enc_id: ('33', '2'))
+    victim.cell_editions = {'US4GA17M': ('33', '3')}
+    assert victim.enc_file_outdated('US4GA17M')
+    victim.cell_editions = {'US4GA17M': ('34', '0')}
+    assert victim.enc_file_outdated('US4GA17M')
+    victim.cell_editions = {'US4GA17M': ('33', '2')}
+    assert not victim.enc_file_outdated('US4GA17M')
+    # ENC files missing from the catalog are kept
+    assert not victim.enc_file_outdated('US5GA20M')
+
+
+def test_get_local_edition(victim, tmp_path, monkeypatch):
+    shutil.copy(ENC_FILE, tmp_path / 'US4GA17M.000')
+    assert victim.get_local_edition('US4GA17M') == ('33', '0')
+
+    # The latest update file holds the current update number
+    for extension in ['001', '002']:
+        (tmp_path / f'US4GA17M.{extension}').write_bytes(b'')
+    update_editions = {str(tmp_path / 'US4GA17M.001'): ('33', '1'), str(tmp_path / 'US4GA17M.002'): ('33', '2')}
+    real_get_dsid_edition = downloader_module.get_dsid_edition
+    monkeypatch.setattr(downloader_module, 'get_dsid_edition', 
+                        lambda enc_path: update_editions.get(enc_path) or real_get_dsid_edition(enc_path))
+    assert victim.get_local_edition('US4GA17M') == ('33', '2')
+
+
+def test_move_to_output_folder(victim, tmp_path):
+    # Older edition with one update already in the output folder
+    (tmp_path / 'US5GA20M.000').write_bytes(b'old')
+    (tmp_path / 'US5GA20M.001').write_bytes(b'old')
+    (tmp_path / 'US5GA20M.003').write_bytes(b'old')
+    download_folder = tmp_path / 'US5GA20M' / 'ENC_ROOT' / 'US5GA20M'
+    download_folder.mkdir(parents=True)
+    for extension in ['000', '001', '002']:
+        (download_folder / f'US5GA20M.{extension}').write_bytes(b'new')
+    new_folder = tmp_path / 'US4GA17M' / 'ENC_ROOT' / 'US4GA17M'
+    new_folder.mkdir(parents=True)
+    (new_folder / 'US4GA17M.000').write_bytes(b'new')
+
+    victim.move_to_output_folder()
+    assert sorted(path.name for path in tmp_path.glob('US5GA20M.*')) == ['US5GA20M.000', 'US5GA20M.001', 'US5GA20M.002']
+    assert all(path.read_bytes() == b'new' for path in tmp_path.glob('US5GA20M.*'))
+    assert (tmp_path / 'US4GA17M.000').read_bytes() == b'new'
+    assert not (tmp_path / 'US5GA20M').exists()
+    assert not (tmp_path / 'US4GA17M').exists()
+
+
+def test_unzip_downloaded_enc_files(victim, tmp_path):
+    with zipfile.ZipFile(tmp_path / 'US5GA20M.zip', 'w') as zipped:
+        zipped.writestr('ENC_ROOT/US5GA20M/US5GA20M.000', b'new')
+        zipped.writestr('ENC_ROOT/US5GA20M/US5GA20M.001', b'new')
+    victim.unzip_downloaded_enc_files(str(tmp_path))
+    assert (tmp_path / 'US5GA20M' / 'ENC_ROOT' / 'US5GA20M' / 'US5GA20M.001').exists()
@@ -6,7 +6,8 @@ import yaml
 import shutil
 
 from osgeo import ogr
-from csf_prf.engines.ENCReaderEngine import ENCReaderEngine
+from csf_prf.engines.ENCReaderEngine import ENCReaderEngine, run_geometry_pipeline
+from csf_prf.helpers.coverage import ScaleCoverage
 
 """
 Unit tests need to havea  .pth file set in your conda ENV that points to CSF-PRF repo
@@ -34,13 +35,16 @@ class Param:
     def valueAsText(self):
         return self.path
 
+    @property
+    def value(self):
+        return self.path
+
 @pytest.fixture
 def victim():
 
     victim = ENCReaderEngine(
         param_lookup={"enc_files": Param(S57_FILE), "output_folder": Param(OUTPUTS)}, 
         sheets_layer=SHEETS_LAYER)
-    victim.set_driver()
     return victim
 
 def test___init__(victim):
@@ -84,23 +88,37 @@ def test_download_gcs():
     ...
 
 
+def test_enc_covers_sheets(victim):
+    enc_file = victim.open_enc_file(ENC_FILE, 'records')
+    coverage_records = list(victim.get_layer_records(enc_file.GetLayerByName('M_COVR')))
+    envelope = ogr.CreateGeometryFromWkt('POLYGON ((-81 31, -81 33, -79 33, -79 31, -81 31))')
+    assert victim.enc_covers_sheets(coverage_records, envelope)
+    far_envelope = ogr.CreateGeometryFromWkt('POLYGON ((10 10, 10 11, 11 11, 11 10, 10 10))')
+    assert not victim.enc_covers_sheets(coverage_records, far_envelope)
+
+
 def test_feature_covered_by_upper_scale(victim): 
     class MultiParam:
         @property
         def valueAsText(self):
             return MULTIPLE_ENC
     victim.param_lookup['enc_files'] = MultiParam()
-    victim.get_enc_catcov()
-    feature_json = {
-        "geometry": {
-            "type": "Point",
-            "coordinates": [-80.6, 32.3]
-        }
-    }
-    result = victim.feature_covered_by_upper_scale(feature_json, 4)
+    victim.get_scale_bounds('ENCReaderEngine')
+    point = ogr.Geometry(ogr.wkbPoint)
+    point.AddPoint_2D(-80.6, 32.3)
+    result = victim.feature_covered_by_upper_scale(bytes(point.ExportToWkb(ogr.wkbNDR)), 4)
     assert result
 
 
+def test_features_covered_by_upper_scale(victim):
+    upper_polygon = ogr.CreateGeometryFromWkt('POLYGON ((0 0, 0 1, 1 1, 1 0, 0 0))')
+    victim.scale_coverages = {4: ScaleCoverage([bytes(upper_polygon.ExportToWkb(ogr.wkbNDR))]), 5: False}
+    inside = bytes(ogr.CreateGeometryFromWkt('POINT (0.5 0.5)').ExportToWkb(ogr.wkbNDR))
+    outside = bytes(ogr.CreateGeometryFromWkt('POINT (2 2)').ExportToWkb(ogr.wkbNDR))
+    assert list(victim.features_covered_by_upper_scale([inside, outside, None], 4)) == [True, False, False]
+    assert list(victim.features_covered_by_upper_scale([inside], 5)) == [False]
+
+
 def test_filter_gc_features(victim):
     victim.gc_points = POINT_FEATURES
     victim.gc_lines = SHP_LINE_FILE
@@ -113,19 +131,39 @@ def test_filter_gc_features(victim):
     assert int(arcpy.management.GetCount(victim.geometries['LineString']['GC_layers']['assigned'])[0]) == 2
 
 
+def test_filter_gc_features_from_start(victim, monkeypatch):
+    class StopRun(Exception):
+        pass
+
+    def merge_gc_features():
+        victim.gc_points = POINT_FEATURES
+        victim.gc_lines = SHP_LINE_FILE
+
+    def stop_run(engine):
+        raise StopRun()
+
+    victim.param_lookup['download_geographic_cells'] = Param(True)
+    monkeypatch.setattr(victim, 'get_gc_data', lambda: [])
+    monkeypatch.setattr(victim, 'store_gc_names', lambda rows: None)
+    monkeypatch.setattr(victim, 'download_gcs', lambda rows: None)
+    monkeypatch.setattr(victim, 'merge_gc_features', merge_gc_features)
+    # Stop once the GC features are filtered
+    monkeypatch.setattr(victim, 'get_scale_bounds', stop_run)
+    with pytest.raises(StopRun):
+        victim.start()
+    assert int(arcpy.management.GetCount(victim.geometries['Point']['GC_layers']['assigned'])[0]) == 11
+    assert int(arcpy.management.GetCount(victim.geometries['LineString']['GC_layers']['assigned'])[0]) == 2
+
+
 def test_get_all_fields(victim):
     features = [
-        {'geojson': {
-            'properties': {
-                'one': 1,
-                'two': 2
-            }
+        {'properties': {
+            'one': 1,
+            'two': 2
         }},
-        {'geojson': {
-            'properties': {
-                'three': 3,
-                'four': 4
-            }
+        {'properties': {
+            'three': 3,
+            'four': 4
         }}
     ]
     results = victim.get_all_fields(features)
@@ -141,11 +179,45 @@ def test_get_aton_lookup(victim):
     assert results[0] == 'BCNCAR'
 
 
+def test_get_attribute_catalog(victim):
+    attribute_catalog = victim.get_attribute_catalog()
+    assert attribute_catalog['SCAMIN'] == ('LONG', None)
+    assert attribute_catalog['VALSOU'] == ('DOUBLE', None)
+    assert attribute_catalog['CATOBS'][0] == 'TEXT'
+    assert attribute_catalog['B_JUSTH'][0] == 'TEXT'
+    assert 'OBJNAM' not in attribute_catalog
+
+
+def test_get_cell_coverage(victim):
+    inner_polygon = ogr.CreateGeometryFromWkt('POLYGON ((0.2 0.2, 0.2 0.8, 0.8 0.8, 0.8 0.2, 0.2 0.2))')
+    outer_polygon = ogr.CreateGeometryFromWkt('POLYGON ((2 2, 2 3, 3 3, 3 2, 2 2))')
+    upper_polygon = ogr.CreateGeometryFromWkt('POLYGON ((0 0, 0 1, 1 1, 1 0, 0 0))')
+    victim.scale_coverages = {4: ScaleCoverage([bytes(upper_polygon.ExportToWkb(ogr.wkbNDR))]), 5: False}
+    inner_records = [{'properties': {'CATCOV': 1}, 'geometry': bytes(inner_polygon.ExportToWkb(ogr.wkbNDR))}]
+    outer_records = [{'properties': {'CATCOV': 1}, 'geometry': bytes(outer_polygon.ExportToWkb(ogr.wkbNDR))}]
+    assert victim.get_cell_coverage(inner_records, 4) == 'covered'
+    assert victim.get_cell_coverage(outer_records, 4) == 'clear'
+    assert victim.get_cell_coverage(inner_records + outer_records, 4) == 'partial'
+    assert victim.get_cell_coverage(inner_records, 5) == 'clear'
+    assert victim.get_cell_coverage([], 4) == 'partial'
+
+
 @pytest.mark.skip(reason="Requires the database password.")
 def test_get_cursor():
     ...    
 
 
+def test_get_row_writer(victim):
+    build_row = victim.get_row_writer(['SHAPE@XY', 'CATOBS', 'OBJL', 'SCALE_LVL', 'SCAMIN', 'VALSOU'])
+    row = build_row((1.0, 2.0), {'OBJL': 86, 'SCALE_LVL': '5', 'SCAMIN': 89999, 'VALSOU': ''})
+    assert row == [(1.0, 2.0), '', '86', '5', 89999, None]
+    assert build_row((3.0, 4.0), {})[1:] == ['', '', '', None, None]
+    # Enumerated text longer than its catalog field is cut to fit
+    catobs_length = victim.get_attribute_catalog()['CATOBS'][1]
+    row = build_row((1.0, 2.0), {'CATOBS': 'pier ( jetty)' * 50})
+    assert row[1] == ('pier ( jetty)' * 50)[:catobs_length]
+
+
 def test_get_scale_bounds(victim):
     class MultiParam:
         @property
@@ -153,19 +225,78 @@ def test_get_scale_bounds(victim):
             return MULTIPLE_ENC
     victim.param_lookup['enc_files'] = MultiParam()
     victim.get_scale_bounds()
-    assert hasattr(victim, 'scale_bounds')
-    assert 4 in victim.scale_bounds
-    assert -80.6109696 == victim.scale_bounds[4][0][0].X
+    assert hasattr(victim, 'scale_coverages')
+    assert 4 in victim.scale_coverages
+    assert victim.scale_coverages[4].polygons_wkb
+
+
+def test_get_enc_cell(victim):
+    victim.enc_cache_folder = OUTPUTS / 'enc_cache'
+    shutil.rmtree(victim.enc_cache_folder, ignore_errors=True)
+    cell = victim.get_enc_cell(S57_FILE)
+    assert len(list(victim.enc_cache_folder.glob('*.cell'))) == 1
+    # The key is built once and reused by later calls
+    assert list(victim.enc_cache_keys) == [S57_FILE]
+    cached_cell = victim.get_enc_cell(S57_FILE)
+    assert cached_cell['metadata'] == cell['metadata']
+    assert [layer['name'] for layer in cached_cell['layers']] == [layer['name'] for layer in cell['layers']]
+    summary = victim.get_enc_cell(S57_FILE, summary_only=True)
+    assert 'layers' not in summary
+    victim.enc_cache_folder = None
+    assert victim.get_enc_cell(S57_FILE) is None
+
+
+def test_get_enc_update_files(victim, tmp_path):
+    for extension in ['000', '010', '001', '002']:
+        (tmp_path / f'US5GA20M.{extension}').write_bytes(b'')
+    update_files = victim.get_enc_update_files(str(tmp_path / 'US5GA20M.000'))
+    assert [pathlib.Path(update_file).suffix for update_file in update_files] == ['.001', '.002', '.010']
 
 
 @pytest.mark.skip(reason="This function requires a test dataset with M_COVR layer")
-def test_get_feature_records(victim):
-    victim.split_multipoint_env()
-    victim.get_scale_bounds()  # TODO test needs M_COVR layer to set victim.scale_bounds
-    victim.get_feature_records()
+def test_get_enc_records(victim):
+    victim.get_scale_bounds('ENCReaderEngine')  # TODO test needs M_COVR layer to set victim.scale_coverages
+    victim.set_feature_lookup()
+    victim.get_enc_records()
     assert len(victim.geometries['Point']['features']) == 2
     assert len(victim.geometries['LineString']['features']) == 1
     assert len(victim.geometries['Polygon']['features']) == 2
+    assert victim.geometries['Point']['QUAPOS'][0]['properties']['QUAPOS'] == 4
+
+
+def test_get_feature_record(victim):
+    enc_file = victim.open_enc_file(ENC_FILE, 'records')
+    layer = enc_file.GetLayerByName('M_COVR')
+    field_names = victim.get_field_names(layer)
+    record = victim.get_feature_record(layer.GetNextFeature(), field_names)
+    assert 'CATCOV' in record['properties']
+    assert record['type'] == 'Polygon'
+    assert isinstance(record['geometry'], bytes)
+
+
+def test_get_field_definitions(victim):
+    field_definitions = victim.get_field_definitions(['OBJNAM', 'SCAMIN', 'VALSOU'])
+    assert field_definitions[0] == ['OBJNAM', 'TEXT', 'OBJNAM', 300]
+    assert field_definitions[1] == ['SCAMIN', 'LONG', 'SCAMIN', '']
+    assert field_definitions[2][1] == 'DOUBLE'
+
+
+def test_get_layer_geometry_types(victim):
+    enc_file = victim.open_enc_file(ENC_FILE, 'records')
+    assert victim.get_layer_geometry_types(enc_file.GetLayerByName('M_COVR')) == ['Polygon']
+    assert victim.get_layer_geometry_types(enc_file.GetLayerByName('DSID')) == []
+
+
+def test_get_layer_rules(victim):
+    victim.set_feature_lookup()
+    lights_rules = victim.get_layer_rules('LIGHTS')
+    assert lights_rules['Point']
+    morfac_rules = victim.get_layer_rules('MORFAC')
+    assert morfac_rules['Point'] is None
+    uwtroc_rules = victim.get_layer_rules('UWTROC')
+    assert not uwtroc_rules['Point']
+    assert uwtroc_rules['Polygon']
+    assert victim.get_layer_rules('IsolatedNode') is None
 
 
 @pytest.mark.skip(reason="This function runs 3 other functions.")
@@ -173,18 +304,49 @@ def test_get_gc_data():
     ...    
 
 
+def test_get_normalized_records(victim):
+    enc_file = victim.open_enc_file(ENC_FILE, 'records')
+    records = list(victim.get_normalized_records(enc_file.GetLayerByName('M_COVR')))
+    assert records
+    for record in records:
+        assert None not in record['properties'].values()
+        assert not any('$' in key for key in record['properties'])
+
+
+def test_get_large_lndare_indices(victim):
+    large = ogr.CreateGeometryFromWkt('POLYGON ((-70 45, -70 45.01, -69.99 45.01, -69.99 45, -70 45))')
+    small = ogr.CreateGeometryFromWkt('POLYGON ((-70 45, -70 45.0001, -69.9999 45.0001, -69.9999 45, -70 45))')
+    records = [
+        {'geometry': bytes(large.ExportToWkb(ogr.wkbNDR)), 'properties': {'OBJL': 71}},
+        {'geometry': bytes(small.ExportToWkb(ogr.wkbNDR)), 'properties': {'OBJL': 71}},
+        {'geometry': bytes(large.ExportToWkb(ogr.wkbNDR)), 'properties': {'OBJL': 42}},
+        {'geometry': None, 'properties': {'OBJL': 71}}
+    ]
+    assert victim.get_large_lndare_indices(records) == {0}
+
+
+def test_get_sheet_assignments(victim):
+    sheet_polygon = ogr.CreateGeometryFromWkt('POLYGON ((0 0, 0 1, 1 1, 1 0, 0 0))')
+    buffer_polygon = ogr.CreateGeometryFromWkt('POLYGON ((-1 -1, -1 2, 2 2, 2 -1, -1 -1))')
+    victim.sheets_coverage = ScaleCoverage([bytes(sheet_polygon.ExportToWkb(ogr.wkbNDR))])
+    victim.sheets_buffer_coverage = ScaleCoverage([bytes(buffer_polygon.ExportToWkb(ogr.wkbNDR))])
+    points = [bytes(ogr.CreateGeometryFromWkt(f'POINT ({x} 0.5)').ExportToWkb(ogr.wkbNDR)) for x in [0.5, 1.5, 3]]
+    assert victim.get_sheet_assignments(points) == ['assigned', 'unassigned', 'outside']
+
+
 def test_get_sql(victim): 
     results = victim.get_sql('GetRelatedENC')
     first_line = 'SELECT doc.BaseFileName, k.iecode, lk.status, doc.Path'
     assert results[55:109] == first_line
 
 
-@pytest.mark.skip(reason="This function requires a test dataset with M_COVR layer")
-def test_get_vector_records(victim):
-    victim.return_primitives_env()
-    victim.get_vector_records()
-    assert 'QUAPOS' in victim.geometries['Point'].keys()
-    assert victim.geometries['Point']['QUAPOS'][0]['geojson']['properties']['QUAPOS'] == 4
+def test_read_enc_cell(victim):
+    victim.scale_coverages = {5: False}
+    victim.set_feature_lookup()
+    records = victim.read_enc_cell(S57_FILE)
+    assert records['intersected'] == 0
+    assert set(records['features'].keys()) == {'Point', 'LineString', 'Polygon'}
+    assert all(record['scale'] == '5' for record in records['features']['Point'])
 
 
 def test_merge_gc_features(victim):
@@ -195,42 +357,41 @@ def test_merge_gc_features(victim):
     assert int(arcpy.management.GetCount(victim.gc_lines)[0]) == 114
 
 
-def test_open_file(victim):
-    victim.open_file(ENC_FILE)
-    results = victim.driver.GetName()
-    assert results == 'S57'
+def test_open_enc_file(victim):
+    enc_file = victim.open_enc_file(ENC_FILE, 'records')
+    assert enc_file.GetDriver().ShortName == 'S57'
+    assert enc_file.GetLayerByName('IsolatedNode') is not None
+    # Readers with different options can be open side by side
+    features_file = victim.open_enc_file(ENC_FILE, 'features')
+    primitives_file = victim.open_enc_file(ENC_FILE, 'primitives')
+    assert features_file.GetLayerByName('IsolatedNode') is None
+    assert primitives_file.GetLayerByName('IsolatedNode') is not None
+
+
+def test_parse_enc_file(victim):
+    cell = victim.parse_enc_file(ENC_FILE)
+    assert cell['metadata']['DSID_INTU'] == 4
+    assert cell['coverage']
+    layer_names = [layer['name'] for layer in cell['layers']]
+    assert 'M_COVR' in layer_names
+    assert 'DSID' not in layer_names
 
 
 def test_perform_spatial_filter(victim):
     geometry_types = {'Point': POINT_FEATURES, 'LineString': SHP_LINE_FILE, 'Polygon': SHP_POLYGON_FILE}
     for geometry in geometry_types:
-        geojson_outputs = []
-        for row in arcpy.da.SearchCursor(geometry_types[geometry], ['FID','OBJL_NAME', 'SHAPE@', 'SHAPE@XY']):
-            id_val = row[0]
-            properties_val = row[1]
-            coordinates_val = []
-            if geometry == 'Point':
-                coordinates_val = list(row[3])
-            elif geometry == 'LineString' or geometry == 'Polygon':
-                for part in row[2]:
-                    for pnt in part:
-                        coordinates_val.append([pnt.X, pnt.Y])
-                    if geometry == 'Polygon':    
-                        coordinates_val = [coordinates_val]
-            geojson = {
-                "geojson": {
-                    "id": id_val,
-                    "properties": {
-                        "OBJL_NAME" : properties_val},
-                    "geometry": {
-                        "type": geometry,
-                        "coordinates": coordinates_val
-                    }                
-                }
+        records = []
+        for row in arcpy.da.SearchCursor(geometry_types[geometry], ['OBJL_NAME', 'SHAPE@WKB']):
+            record = {
+                "properties": {
+                    "OBJL_NAME" : row[0]},
+                "geometry": bytes(row[1]),
+                "type": geometry
             }
-            geojson_outputs.append(geojson)
-        victim.geometries[geometry]['features'] = geojson_outputs        
+            records.append(record)
+        victim.geometries[geometry]['features'] = records        
 
+    victim.set_sheets_envelope()
     victim.perform_spatial_filter()
     assert victim.geometries['Point']['features_layers']['assigned'] is not None
     assert victim.geometries['Point']['features_layers']['unassigned'] is not None
@@ -271,9 +432,28 @@ def test_join_quapos_to_features(victim):
     arcpy.management.Delete(COPIED_POINT_FEATURES)
     
 
-def test_return_primitives_env(victim):
-    victim.return_primitives_env()
-    assert os.environ["OGR_S57_OPTIONS"] == "RETURN_PRIMITIVES=ON,LIST_AS_STRING=ON,PRESERVE_EMPTY_NUMBERS=ON"
+def test_run_geometry_pipeline(victim):
+    records = [{'properties': {'OBJL_NAME': row[0]}, 'geometry': bytes(row[1]), 'type': 'LineString'} 
+               for row in arcpy.da.SearchCursor(SHP_LINE_FILE, ['OBJL_NAME', 'SHAPE@WKB'])]
+    prepared_sheets = victim.prepare_sheets(SHEETS_LAYER)
+    worker_gdb, outputs = run_geometry_pipeline(('LineString', records, [], prepared_sheets, str(OUTPUTS), False))
+    assert worker_gdb == os.path.join(str(OUTPUTS), 'csf_features_LineString.geodatabase')
+    assert [output[:3] for output in outputs] == [
+        ('features', 'assigned', 'LineString_features_assigned'),
+        ('features', 'unassigned', 'LineString_features_unassigned'),
+        ('QUAPOS', 'assigned', 'LineString_QUAPOS_assigned'),
+        ('QUAPOS', 'unassigned', 'LineString_QUAPOS_unassigned')
+    ]
+    assert all(arcpy.Exists(output[3]) for output in outputs)
+
+    victim.create_output_gdb()
+    victim.merge_geometry_outputs('LineString', worker_gdb, outputs)
+    assigned = victim.geometries['LineString']['features_layers']['assigned']
+    assert assigned == os.path.join(str(OUTPUTS), 'csf_features.geodatabase', 'LineString_features_assigned')
+    assert victim.output_data['LineString_QUAPOS_unassigned'] == victim.geometries['LineString']['QUAPOS_layers']['unassigned']
+    unassigned = victim.geometries['LineString']['features_layers']['unassigned']
+    assert int(arcpy.management.GetCount(assigned)[0]) + int(arcpy.management.GetCount(unassigned)[0]) <= len(records)
+    assert not arcpy.Exists(worker_gdb)
 
 
 @pytest.mark.skip(reason="This function will be tested later with a mock object.")
@@ -317,12 +497,6 @@ def test_set_assigned_invreq(victim):
     assert 'serving intended purpose' in test_data[10][0]
 
 
-def test_set_driver(victim): 
-    victim.set_driver()
-    results = victim.driver.GetName()
-    assert results == 'S57'
-
-
 def test_set_none_to_null(victim):
     feature_json = {
         'type': 'Feature',
@@ -340,6 +514,17 @@ def test_set_none_to_null(victim):
     assert results['properties']['type'] == ''
 
 
+def test_set_sheets_envelope(victim):
+    victim.set_sheets_envelope()
+    envelope = ogr.CreateGeometryFromWkb(victim.sheets_envelope)
+    assert envelope.GetGeometryName() == 'MULTIPOLYGON'
+    assert envelope.GetGeometryCount() > 0
+    assert victim.sheets_coverage.polygons.size > 0
+    # Buffered Sheets polygons are indexed as one or more pieces
+    assert victim.sheets_buffer_coverage.polygons.size >= envelope.GetGeometryCount()
+    assert victim.prepared_sheets.envelope == victim.sheets_envelope
+
+
 def test_set_unassigned_invreq(victim): 
     layer = arcpy.management.CopyFeatures(POINT_FEATURES, r'memory\test_layer')
     victim.geometries['Point']['features_layers']['unassigned'] = layer
@@ -354,9 +539,14 @@ def test_set_unassigned_invreq(victim):
     assert test_data[0][0] == ' ' # OBJL name not in invreq_lookup.yaml check
 
 
-def test_split_multipoint_env(victim):
-    victim.split_multipoint_env()
-    assert os.environ["OGR_S57_OPTIONS"] == "SPLIT_MULTIPOINT=ON,LIST_AS_STRING=ON,PRESERVE_EMPTY_NUMBERS=ON,ADD_SOUNDG_DEPTH=ON"
+def test_stream_enc_records(victim):
+    victim.scale_coverages = {5: False}
+    victim.set_feature_lookup()
+    victim.set_sheets_envelope()
+    victim.stream_enc_records()
+    assert victim.geometries['Point']['features'] == []
+    assert victim.geometries['Point']['features_layers']['assigned'] is not None
+    assert victim.geometries['Polygon']['QUAPOS_layers']['unassigned'] is not None
 
 
 def test_store_gc_names(victim): 
@@ -385,4 +575,10 @@ def test_unapproved(victim):
 def test_unapproved_subcategory(victim):
     unapproved_feature_subcategory = {'OBJL_NAME': 'SLCONS', 'CONDTN': 2}
     slcons_condtn_is_two = victim.unapproved_subcategory('Point', 'SLCONS', unapproved_feature_subcategory)
-    assert slcons_condtn_is_two
\ No newline at end of file
+    assert slcons_condtn_is_two
+
+def test_truncate_text(victim):
+    assert victim.truncate_text('pier ( jetty)', 4) == 'pier'
+    assert victim.truncate_text('pier', 10) == 'pier'
+    assert victim.truncate_text('pier ( jetty)', None) == 'pier ( jetty)'
+    assert victim.truncate_text(None, 4) is None
@@ -24,24 +24,22 @@ def victim():
 
 @pytest.fixture
 def willing_victim(victim):
-    victim.set_driver()
-    victim.return_primitives_env()
     victim.get_scale_bounds()
     return victim
     
 
 def test___init__(victim):
     assert hasattr(victim, 'intersected')
-    assert hasattr(victim, 'scale_bounds')
+    assert hasattr(victim, 'scale_coverages')
     assert 'dissolved' in victim.layers.keys()
     assert 'LNDARE' in victim.features.keys()
     assert 'LNDARE' in victim.layers.keys()
 
 
 def test_get_scale_bounds(willing_victim):
-    assert 2 in willing_victim.scale_bounds.keys()
-    assert 5 in willing_victim.scale_bounds.keys()
-    assert 3 not in willing_victim.scale_bounds.keys()
+    assert 2 in willing_victim.scale_coverages.keys()
+    assert 5 in willing_victim.scale_coverages.keys()
+    assert 3 not in willing_victim.scale_coverages.keys()
 
 
 def test_get_high_water_features(willing_victim):
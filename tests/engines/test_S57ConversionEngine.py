@@ -45,12 +45,12 @@ def test___init__(victim):
 def test_catch_invalid_records_fail(victim):
     victim.geometries = {
         'Point': {
-            'features': [{'geojson': {"properties": {"value": "1"}}}], 
-            'QUAPOS': [{'geojson': {"properties": {"value": "1"}}}]
+            'features': [{"properties": {"value": "1"}}], 
+            'QUAPOS': [{"properties": {"value": "1"}}]
         },
         'LineString': {
-            'features': [{'geojson': {"properties": {"value": "1"}}}], 
-            'QUAPOS': [{'geojson': {"properties": {"value": "1"}}}, {'geojson': {"properties": {"value": "2"}}}]
+            'features': [{"properties": {"value": "1"}}], 
+            'QUAPOS': [{"properties": {"value": "1"}}, {"properties": {"value": "2"}}]
         },
         'Polygon': {
             'features': [], 
@@ -70,8 +70,8 @@ def test_catch_invalid_records_pass(victim):
             'QUAPOS': []
         },
         'LineString': {
-            'features': [{'geojson': {"properties": {"value": "1"}}}], 
-            'QUAPOS': [{'geojson': {"properties": {"value": "1"}}}]
+            'features': [{"properties": {"value": "1"}}], 
+            'QUAPOS': [{"properties": {"value": "1"}}]
         },
         'Polygon': {
             'features': [], 
@@ -83,6 +83,16 @@ def test_catch_invalid_records_pass(victim):
     assert True
 
 
+def test_read_enc_layers(victim):
+    layer_count = victim.open_enc_file(S57_FILE, 'records').GetLayerCount()
+    layer_indexes = list(range(layer_count))
+    layer_records = victim.read_enc_layers(S57_FILE, layer_indexes)
+    assert sorted(layer_records) == layer_indexes
+    split_records = victim.read_enc_layers(S57_FILE, layer_indexes[1::2])
+    assert split_records[1] == layer_records[1]
+    assert 0 not in split_records
+
+
 def test_project_rows_to_wgs84(victim):
     victim.gdb_name = 'unit_tests'
     victim.create_output_gdb(gdb_name=victim.gdb_name)
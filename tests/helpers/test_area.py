@@ -0,0 +1,25 @@
+import pytest
+import numpy as np
+import shapely
+
+from csf_prf.helpers.area import SEMI_MAJOR_AXIS, get_authalic_q, get_polygon_areas, project_albers
+
+
+def test_project_albers():
+    projected = project_albers(np.array([[-96.0, 40.0], [-70.0, 45.0]]))
+    assert projected[0] == pytest.approx([0, 0], abs=1e-6)
+    assert projected[1][0] > 0 and projected[1][1] > 0
+
+
+def test_get_polygon_areas():
+    size = 0.01
+    cell = shapely.box(-70, 45, -70 + size, 45 + size)
+    # Area of a graticule cell on the ellipsoid
+    expected = SEMI_MAJOR_AXIS ** 2 * np.radians(size) * (get_authalic_q(45 + size) - get_authalic_q(45)) / 2
+    with_hole = shapely.Polygon(cell.exterior.coords, [shapely.box(-69.998, 45.002, -69.993, 45.007).exterior.coords])
+    two_parts = shapely.MultiPolygon([cell, shapely.box(-60, 45, -60 + size, 45 + size)])
+    areas = get_polygon_areas([shapely.to_wkb(cell), shapely.to_wkb(with_hole), shapely.to_wkb(two_parts)])
+    assert areas[0] == pytest.approx(expected, rel=1e-6)
+    assert areas[1] == pytest.approx(expected * 0.75, rel=1e-3)
+    assert areas[2] == pytest.approx(expected * 2, rel=1e-6)
+    assert get_polygon_areas([]).size == 0
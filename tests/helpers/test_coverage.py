@@ -0,0 +1,96 @@
+import pytest
+import pickle
+import numpy as np
+import shapely
+
+from csf_prf.helpers.coverage import ScaleCoverage, BOUNDARY, CLEAR, COVERED, subdivide_polygons
+
+
+@pytest.fixture
+def victim():
+    polygons = [shapely.box(0, 0, 1, 1), shapely.box(5, 5, 6, 6)]
+    victim = ScaleCoverage([shapely.to_wkb(polygon) for polygon in polygons])
+    return victim
+
+
+def test___getstate__(victim):
+    unpickled = pickle.loads(pickle.dumps(victim))
+    assert unpickled.polygons_wkb == victim.polygons_wkb
+    assert unpickled.intersects(shapely.to_wkb(shapely.Point(0.5, 0.5)))
+
+
+def test_intersects(victim):
+    assert victim.intersects(shapely.to_wkb(shapely.Point(5.5, 5.5)))
+    assert victim.intersects(shapely.to_wkb(shapely.LineString([(-1, 0.5), (2, 0.5)])))
+    assert not victim.intersects(shapely.to_wkb(shapely.Point(3, 3)))
+    # Envelope overlaps both polygons but the line passes between them
+    assert not victim.intersects(shapely.to_wkb(shapely.LineString([(0, 2), (4, 6)])))
+
+
+def test_classify(victim):
+    assert victim.classify([shapely.to_wkb(shapely.box(0.2, 0.2, 0.8, 0.8))]) == 'covered'
+    assert victim.classify([shapely.to_wkb(shapely.box(2, 2, 3, 3))]) == 'clear'
+    assert victim.classify([shapely.to_wkb(shapely.box(0.5, 0.5, 1.5, 1.5))]) == 'partial'
+    assert victim.classify([shapely.to_wkb(shapely.box(0.2, 0.2, 0.8, 0.8)), 
+                            shapely.to_wkb(shapely.box(2, 2, 3, 3))]) == 'partial'
+
+
+def test_intersects_all(victim):
+    geometries = [
+        shapely.to_wkb(shapely.Point(0.5, 0.5)),
+        None,
+        shapely.to_wkb(shapely.Point(3, 3)),
+        shapely.to_wkb(shapely.LineString([(4, 5.5), (7, 5.5)]))
+    ]
+    assert victim.intersects_all(geometries).tolist() == [True, False, False, True]
+    assert victim.intersects_all([]).tolist() == []
+
+
+def test_build_grid(victim):
+    assert victim.grid.shape == (victim.grid_size, victim.grid_size)
+    assert victim.grid[0, 0] == COVERED
+    assert victim.grid[victim.grid_size // 2, victim.grid_size // 2] == CLEAR
+    assert (victim.grid == BOUNDARY).any()
+
+
+def test_get_grid_states(victim):
+    geometries = np.array([
+        shapely.Point(0.5, 0.5),
+        shapely.Point(3, 3),
+        shapely.Point(10, 10),
+        None,
+        shapely.LineString([(0.5, 0.5), (5.5, 5.5)])
+    ])
+    assert victim.get_grid_states(geometries).tolist() == [COVERED, CLEAR, CLEAR, CLEAR, BOUNDARY]
+
+
+def test_intersects_all_matches_exact(victim):
+    rng = np.random.default_rng(0)
+    points = shapely.points(rng.uniform(-1, 7, (2000, 2)))
+    lines = shapely.linestrings(rng.uniform(-1, 7, (500, 2, 2)))
+    geometries = np.concatenate([points, lines])
+    exact = shapely.intersects(shapely.union_all(victim.polygons), geometries)
+    assert victim.intersects_all(shapely.to_wkb(geometries).tolist()).tolist() == exact.tolist()
+
+
+def test_subdivide_polygons():
+    circle = shapely.Point(0, 0).buffer(1, quad_segs=200)
+    small = shapely.box(5, 5, 6, 6)
+    pieces, indices = subdivide_polygons([shapely.to_wkb(circle), shapely.to_wkb(small)], max_vertices=64)
+    pieces = shapely.from_wkb(pieces)
+    assert indices.count(1) == 1
+    assert indices.count(0) > 1
+    assert shapely.get_num_coordinates(pieces).max() <= 64
+    circle_pieces = [piece for piece, index in zip(pieces, indices) if index == 0]
+    assert shapely.union_all(circle_pieces).area == pytest.approx(circle.area)
+
+
+def test_intersects_all_large_polygons():
+    ring = shapely.Point(0, 0).buffer(10, quad_segs=300).difference(shapely.Point(0, 0).buffer(9, quad_segs=300))
+    victim = ScaleCoverage([shapely.to_wkb(ring)])
+    assert victim.polygons.size > 1
+    assert set(victim.piece_indices.tolist()) == {0}
+    # Large query polygons are split too, the hole of the ring is not covered
+    geometries = [shapely.Point(0, 0).buffer(8.5, quad_segs=300), shapely.Point(0, 0).buffer(9.5, quad_segs=300), shapely.box(20, 20, 21, 21)]
+    assert victim.intersects_all(shapely.to_wkb(geometries).tolist()).tolist() == [False, True, False]
+    assert victim.classify([shapely.to_wkb(shapely.box(9.2, -0.1, 9.8, 0.1))]) == 'covered'
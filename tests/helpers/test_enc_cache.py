@@ -0,0 +1,103 @@
+import pytest
+import pathlib
+import os
+import time
+
+from csf_prf.helpers.enc_cache import ENCCache, get_dsid_edition
+
+
+REPO = pathlib.Path(__file__).parents[2]
+INPUTS = REPO / 'inputs'
+OUTPUTS = REPO / 'outputs'
+
+ENC_FILE = str(INPUTS / 'US4GA17M.000')
+
+
+@pytest.fixture
+def victim(tmp_path):
+    victim = ENCCache(tmp_path / 'enc_cache', max_size=1024 ** 2)
+    return victim
+
+
+def test_get_dsid_edition():
+    edition, update = get_dsid_edition(ENC_FILE)
+    assert edition == '33'
+    assert update == '0'
+
+
+def test_get_coverage_key(victim):
+    key = victim.get_coverage_key(['ENCReaderEngine'], ['US5SC21M_1_0', 'US4GA17M_33_0'])
+    assert key.startswith('coverage_')
+    assert key == victim.get_coverage_key(['ENCReaderEngine'], ['US4GA17M_33_0', 'US5SC21M_1_0'])
+    assert key != victim.get_coverage_key(['MHWBufferEngine', '0.0008'], ['US4GA17M_33_0', 'US5SC21M_1_0'])
+    assert key != victim.get_coverage_key(['ENCReaderEngine'], ['US4GA17M_33_1', 'US5SC21M_1_0'])
+
+
+def test_get_edition(victim):
+    assert victim.get_edition(ENC_FILE) == 'US4GA17M_33_0'
+
+
+def test_get_key(victim):
+    key = victim.get_key(ENC_FILE)
+    assert key.startswith('US4GA17M_33_0_')
+    assert key == victim.get_key(ENC_FILE)
+
+
+def test_get_key_with_updates(victim, tmp_path):
+    # Any .001 file changes the content hash, so the ENC file is read again
+    update_file = tmp_path / 'US4GA17M.001'
+    update_file.write_bytes(b'update')
+    key = victim.get_key(ENC_FILE, [str(update_file)])
+    assert key != victim.get_key(ENC_FILE)
+
+
+def test_load(victim):
+    assert victim.load('missing') is None
+    cell = {'metadata': {'DSID_INTU': 4}, 'coverage': [], 'layers': [{'name': 'M_COVR', 'records': []}]}
+    victim.store('cell', cell)
+    assert victim.load('cell') == cell
+    assert 'layers' not in victim.load('cell', summary_only=True)
+
+
+def test_load_coverage(victim):
+    assert victim.load_coverage('missing') is None
+    coverage = {'scale_polygons': {5: [bytes(10)]}, 'scale_extents': {}, 'upper_scales': {4: [5], 5: []}}
+    victim.store_coverage('coverage', coverage)
+    assert victim.load_coverage('coverage') == coverage
+    assert victim.load('coverage') is None
+
+
+def test_evict(victim):
+    victim.max_size = 2500
+    layers = [{'name': 'LNDARE', 'records': [{'geometry': bytes(1000)}]}]
+    for index, key in enumerate(['first', 'second']):
+        victim.store(key, {'metadata': {}, 'coverage': [], 'layers': layers})
+        # Make sure each file has an older modified time than the next one
+        used_time = time.time() - 10 + index
+        os.utime(victim.get_cache_path(key), (used_time, used_time))
+    victim.store('third', {'metadata': {}, 'coverage': [], 'layers': layers})
+    cached_keys = sorted(path.stem for path in victim.cache_folder.glob('*.cell'))
+    assert 'first' not in cached_keys
+    assert 'third' in cached_keys
+
+
+def test_evict_locked_file(victim, monkeypatch):
+    victim.store('cell', {'metadata': {}, 'coverage': [], 'layers': []})
+    victim.max_size = 0
+    # Windows blocks removing a file another process has open
+    def locked_unlink(path, missing_ok=False):
+        raise PermissionError(path)
+    monkeypatch.setattr(pathlib.Path, 'unlink', locked_unlink)
+    victim.evict()
+    assert victim.get_cache_path('cell').exists()
+
+
+def test_write_locked_file(victim, monkeypatch):
+    victim.store('cell', {'metadata': {}, 'coverage': [], 'layers': []})
+    # Windows blocks replacing a file another process has open
+    def locked_replace(source, destination):
+        raise PermissionError(destination)
+    monkeypatch.setattr(os, 'replace', locked_replace)
+    victim.store('cell', {'metadata': {'DSID_INTU': 4}, 'coverage': [], 'layers': []})
+    assert victim.load('cell')['metadata'] == {}
+    assert not list(victim.cache_folder.glob('*.tmp'))
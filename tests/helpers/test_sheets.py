@@ -0,0 +1,42 @@
+import pytest
+import pickle
+import shapely
+
+from csf_prf.helpers.sheets import PreparedSheets
+
+
+@pytest.fixture
+def victim():
+    sheet = shapely.Point(0, 0).buffer(1, quad_segs=200)
+    # Self intersecting bowtie is repaired into two triangles
+    bowtie = shapely.from_wkt('POLYGON ((5 5, 6 6, 6 5, 5 6, 5 5))')
+    victim = PreparedSheets([shapely.to_wkb(sheet), shapely.to_wkb(bowtie)], [shapely.to_wkb(sheet.buffer(0.5))])
+    return victim
+
+
+def test___init__(victim):
+    assert len(victim.sheets_wkb) == 2
+    assert victim.coverage.polygons.size > len(victim.sheets_wkb)
+    assert victim.coverage.intersects(shapely.to_wkb(shapely.Point(5.9, 5.5)))
+    assert not victim.coverage.intersects(shapely.to_wkb(shapely.Point(1.2, 0)))
+    assert victim.buffer_coverage.intersects(shapely.to_wkb(shapely.Point(1.2, 0)))
+    assert PreparedSheets(victim.sheets_wkb).buffer_coverage is None
+
+
+def test_get_envelope(victim):
+    envelope = shapely.from_wkb(victim.envelope)
+    assert envelope.geom_type == 'MultiPolygon'
+    assert envelope.bounds == pytest.approx((-1.5, -1.5, 1.5, 1.5), abs=1e-3)
+
+
+def test_pickle(victim):
+    unpickled = pickle.loads(pickle.dumps(victim))
+    assert unpickled.coverage.intersects(shapely.to_wkb(shapely.Point(0, 0)))
+
+
+def test_repair(victim):
+    bowtie = shapely.from_wkt('POLYGON ((5 5, 6 6, 6 5, 5 6, 5 5))')
+    repaired = victim.repair([shapely.to_wkb(bowtie), None])
+    assert len(repaired) == 1
+    assert shapely.from_wkb(repaired[0]).is_valid
+    assert shapely.from_wkb(repaired[0]).area == pytest.approx(0.5)